@@ -0,0 +1,324 @@
+"""
+Offline benchmarks for the /check and /verify hot paths
+
+    python benchmarks.py                          # run everything, print a table
+    python benchmarks.py -k verify                # only cases with "verify" in the name
+    python benchmarks.py -o after.json --compare before.json
+
+Nothing leaves the machine - the upstream fallback goes to upstream_standin and /verify uses a throwaway
+CA from tq8_fixtures.
+"""
+import os
+import json
+import gzip
+import time
+import base64
+import platform
+import argparse
+import datetime
+import threading
+
+def percentiles(samples, points=(50, 95, 99)):
+    """
+    Nearest rank percentiles of samples (any unit), as {"p50": ..}
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {f"p{point}": None for point in points}
+    return {f"p{point}": ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))] for point in points}
+
+def measure(fn, duration=1.0, min_iterations=20, warmup=5):
+    """
+    Calls fn repeatedly for about duration seconds and returns ops/s and latency percentiles in microseconds
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_iterations or time.perf_counter() - started < duration:
+        t = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - t) / 1000)
+    elapsed = time.perf_counter() - started
+    result = {"iterations": len(samples), "ops_per_sec": len(samples) / elapsed}
+    result.update({f"{name}_us": value for name, value in percentiles(samples).items()})
+    return result
+
+def expect_error(fn, *args):
+    def run():
+        try:
+            fn(*args)
+        except ValueError:
+            return
+        raise AssertionError("expected a rejection")
+    return run
+
+def expect_status(status, fn, *args):
+    def run():
+        response = fn(*args)
+        if response["statusCode"] != status:
+            raise AssertionError(f"expected a {status}, got {response['statusCode']}")
+    return run
+
+CASES = {}
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+def _check_event(callsign, timestamp, code):
+    return {"pathParameters": {"callsign": callsign, "timestamp": timestamp, "code": f"{code}.text"}}
+
+TIMESTAMP = "2024-09-05T19:07:00Z"
+
+@case("validate_local_hit")
+def _(args):
+    from fotw import check, keys
+    code = keys.UserKey("VK3FUR").hotp.at(int(datetime.datetime.fromisoformat(TIMESTAMP).timestamp() // 30))
+    event = _check_event("VK3FUR", TIMESTAMP, code)
+    return lambda: check.validate(event, None)
+
+@case("validate_local_miss_upstream")
+def _(args):
+    from fotw import check, result_cache
+    result_cache.backend = result_cache.NullBackend() # every call goes out to the stand-in
+    event = _check_event("VK3FUR", TIMESTAMP, "000000")
+    return expect_status(200, check.validate, event, None) # a 429 would be timing the rate limiter, not the fallback
+
+@case("validate_local_miss_cached")
+def _(args):
+    from fotw import check, result_cache
+    result_cache.backend = result_cache.MemoryBackend()
+    event = _check_event("VK3FUR", TIMESTAMP, "000000")
+    return lambda: check.validate(event, None)
+
+@case("validate_future_rejection")
+def _(args):
+    from fotw import check
+    event = _check_event("VK3FUR", "2099-01-01T00:00:00Z", "000000")
+    return expect_error(check.validate, event, None)
+
+@case("validate_batch_50_local")
+def _(args):
+    from fotw import check, keys
+    counter = int(datetime.datetime.fromisoformat(TIMESTAMP).timestamp() // 30)
+    checks = [{"callsign": f"VK3F{i:02d}", "timestamp": TIMESTAMP, "code": keys.UserKey(f"VK3F{i:02d}").hotp.at(counter)} for i in range(50)]
+    event = {"body": json.dumps(checks)}
+    return lambda: check.validate_batch(event, None)
+
+def _verify_fixture(args):
+    """
+    Returns a function building a /verify event, with fotw.verify pointed at a throwaway CA
+    """
+    import tq8_fixtures
+    from fotw import verify
+    if not hasattr(_verify_fixture, "ca"):
+        _verify_fixture.ca = tq8_fixtures.TestCA()
+        _verify_fixture.user = _verify_fixture.ca.issue("VK3FUR")
+    verify.ca = lambda: _verify_fixture.ca.cert
+    verify.VERIFICATION_SIGDATA = "ZZ9FOTWFT8"
+    def event(user=None, when=None, **kwargs):
+        when = when or datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        log = tq8_fixtures.make_tq8([(user or _verify_fixture.user, when)], **kwargs)
+        return {"body": base64.b64encode(gzip.compress(log.encode())).decode()}
+    return event
+
+@case("verify_ok")
+def _(args):
+    from fotw import verify
+    event = _verify_fixture(args)()
+    return lambda: verify.verify(event, None)
+
+@case("verify_ok_cold_cert")
+def _(args):
+    from fotw import verify
+    event = _verify_fixture(args)()
+    def run():
+        verify._cert_cache.clear()
+        verify.verify(event, None)
+    return run
+
+@case("verify_ok_4_certs")
+def _(args):
+    import tq8_fixtures
+    from fotw import verify
+    _verify_fixture(args)
+    when = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    users = [_verify_fixture.user] + [_verify_fixture.ca.issue(f"VK3F{i:02d}") for i in range(3)]
+    event = {"body": base64.b64encode(gzip.compress(tq8_fixtures.make_tq8([(user, when) for user in users]).encode())).decode()}
+    return lambda: verify.verify(event, None)
+
+@case("verify_reject_too_many_records")
+def _(args):
+    from fotw import verify
+    make = _verify_fixture(args)
+    event = make()
+    log = gzip.decompress(base64.b64decode(event["body"]))
+    event = {"body": base64.b64encode(gzip.compress(log + log)).decode()}
+    return expect_error(verify.verify, event, None)
+
+@case("verify_reject_dates")
+def _(args):
+    from fotw import verify
+    event = _verify_fixture(args)(when=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=verify.DAYS_VALID + 10))
+    return expect_error(verify.verify, event, None)
+
+@case("verify_reject_signdata")
+def _(args):
+    from fotw import verify
+    event = _verify_fixture(args)(call="BB9FOTW")
+    return expect_error(verify.verify, event, None)
+
+@case("verify_reject_wrong_ca")
+def _(args):
+    import tq8_fixtures
+    from fotw import verify
+    make = _verify_fixture(args)
+    event = make(user=tq8_fixtures.TestCA("Someone Else").issue("VK3FUR"))
+    return expect_error(verify.verify, event, None)
+
+@case("verify_reject_cert_expired")
+def _(args):
+    from fotw import verify
+    make = _verify_fixture(args)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expired = _verify_fixture.ca.issue("VK3FUR", not_before=now - datetime.timedelta(days=400), not_after=now - datetime.timedelta(days=1))
+    event = make(user=expired)
+    return expect_error(verify.verify, event, None)
+
+@case("verify_reject_bad_signature")
+def _(args):
+    from fotw import verify
+    event = _verify_fixture(args)(signature=base64.b64encode(b"\0" * 128).decode())
+    return expect_error(verify.verify, event, None)
+
+@case("verify_reject_not_gzipped")
+def _(args):
+    from fotw import verify
+    event = {"body": base64.b64encode(b"definitely not a log").decode()}
+    return expect_error(verify.verify, event, None)
+
+def _revocation_fixture(args):
+    """
+    Points fotw.revocation at an index of args.revocation_entries random keys, plus the fixture user's cert.
+    Returns (fingerprint, serial) of a revoked cert
+    """
+    import tempfile
+    from fotw import revocation, sortedindex
+    if getattr(_revocation_fixture, "entries", None) != args.revocation_entries:
+        blob = os.urandom(revocation.KEY_BYTES * args.revocation_entries)
+        keys = [blob[i:i + revocation.KEY_BYTES] for i in range(0, len(blob), revocation.KEY_BYTES)]
+        directory = _revocation_fixture.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "revocation.idx")
+        started = time.perf_counter()
+        sortedindex.build(path, keys + [revocation.serial_key(1)], revocation.KEY_BYTES)
+        print(f"# built a {args.revocation_entries} entry revocation index in {time.perf_counter() - started:.1f}s")
+        _revocation_fixture.entries = args.revocation_entries
+        _revocation_fixture.revoked = (keys[len(keys) // 3], 2)
+    revocation.REVOCATION_INDEX = os.path.join(_revocation_fixture.directory.name, "revocation.idx")
+    return _revocation_fixture.revoked
+
+@case("revocation_lookup_hit")
+def _(args):
+    from fotw import revocation
+    fingerprint, serial = _revocation_fixture(args)
+    return lambda: revocation.is_revoked(fingerprint, serial)
+
+@case("revocation_lookup_miss")
+def _(args):
+    from fotw import revocation
+    _revocation_fixture(args)
+    fingerprint = os.urandom(revocation.KEY_BYTES)
+    return lambda: revocation.is_revoked(fingerprint, 12345)
+
+@case("verify_ok_revocation_checked")
+def _(args):
+    from fotw import verify
+    event = _verify_fixture(args)()
+    _revocation_fixture(args)
+    return lambda: verify.verify(event, None)
+
+@case("server_check_local_hit")
+def _(args):
+    # same as validate_local_hit but through fotw.server over a keep-alive connection
+    import asyncio
+    import http.client
+    from fotw import keys, server
+    started = threading.Event()
+    def ready(listener, _server):
+        ready.port = listener.sockets[0].getsockname()[1]
+        started.set()
+    loop = asyncio.new_event_loop()
+    loop.create_task(server.serve("127.0.0.1", 0, 0, 4, ready))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    started.wait(5)
+    code = keys.UserKey("VK3FUR").hotp.at(int(datetime.datetime.fromisoformat(TIMESTAMP).timestamp() // 30))
+    connection = http.client.HTTPConnection("127.0.0.1", ready.port)
+    path = f"/check/VK3FUR/{TIMESTAMP}/{code}.text"
+    def run():
+        connection.request("GET", path)
+        connection.getresponse().read()
+    return run
+
+def compare(before, after):
+    print()
+    print(f"{'case':38} {'ops/s before':>14} {'ops/s after':>14} {'change':>8} {'p99 before':>12} {'p99 after':>12}")
+    for name, result in after.items():
+        old = before.get(name)
+        if old is None:
+            continue
+        change = (result["ops_per_sec"] / old["ops_per_sec"] - 1) * 100
+        print(f"{name:38} {old['ops_per_sec']:14.0f} {result['ops_per_sec']:14.0f} {change:+7.1f}% {old['p99_us']:12.1f} {result['p99_us']:12.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FoTW handler benchmarks")
+    parser.add_argument("-k", dest="filter", default="", help="only run cases containing this")
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds per case")
+    parser.add_argument("--upstream-latency", type=float, default=0.02, help="stand-in 9dx.cc latency in seconds")
+    parser.add_argument("--revocation-entries", type=int, default=1000000, help="size of the revocation index for the revocation cases")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("SECRET", "benchmark-secret")
+    import upstream_standin
+    from fotw import upstream, ratelimit, breaker
+    standin = upstream_standin.StandIn(delay=args.upstream_latency)
+    upstream.UPSTREAMS = [standin.url]
+    # the same callsign over and over would be rate limited after the burst, time the fallback itself
+    ratelimit.callsigns = ratelimit.Limiter(rate=0)
+    ratelimit.ips = ratelimit.Limiter(rate=0)
+    breaker.reset()
+
+    results = {}
+    print(f"{'case':38} {'ops/s':>10} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10}")
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(setup(args), duration=args.duration)
+        print(f"{name:38} {result['ops_per_sec']:10.0f} {result['p50_us']:10.1f} {result['p95_us']:10.1f} {result['p99_us']:10.1f}")
+    standin.stop()
+    from fotw import revocation
+    revocation.REVOCATION_INDEX = None
+    ratelimit.reset()
+    breaker.reset()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "upstream_latency": args.upstream_latency
+                },
+                "results": results
+            }, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"], results)
+
+if __name__ == "__main__":
+    main()
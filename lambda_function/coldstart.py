@@ -0,0 +1,148 @@
+"""
+Cold start numbers for each handler - a fresh interpreter per run, like a new Lambda execution environment
+
+    python coldstart.py                  # against this checkout
+    python coldstart.py --image fotw     # inside the built image (docker run --entrypoint python)
+    python coldstart.py -n 20 -o coldstart.json
+
+For each run it reports the handler module's import time (Lambda's init phase), the first invocation
+(which pays for whatever the handler imports lazily), peak RSS after each, and the whole process wall time.
+/verify is fed a log signed by a throwaway CA that is handed to the child as CA_PATH, so it gets all the
+way through the signature check. Nothing needs the network.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import datetime
+import subprocess
+import statistics
+
+HANDLERS = ["fotw.check.validate", "fotw.verify.verify"]
+
+# runs in the child. init_ms starts after interpreter start up and this script's own stdlib imports
+CHILD = r"""
+import time
+import os, sys, json, resource, tempfile, importlib
+def peak_rss_kb():
+    # ru_maxrss carries over the parent's peak across fork + exec on Linux, VmHWM starts over
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+payload = json.loads(sys.stdin.read())
+if payload.get("ca_pem"):
+    with tempfile.NamedTemporaryFile("w", suffix=".pem", delete=False) as f:
+        f.write(payload["ca_pem"])
+    os.environ["CA_PATH"] = f.name
+os.environ.update(payload["env"])
+t1 = time.perf_counter()
+module, name = payload["handler"].rsplit(".", 1)
+handler = getattr(importlib.import_module(module), name)
+t2 = time.perf_counter()
+rss_init = peak_rss_kb()
+try:
+    outcome = str(handler(payload["event"], None).get("statusCode", 200))
+except Exception as e:
+    outcome = f"{type(e).__name__}: {e}"
+t3 = time.perf_counter()
+print(json.dumps({
+    "init_ms": (t2 - t1) * 1000,
+    "first_call_ms": (t3 - t2) * 1000,
+    "rss_init_kb": rss_init,
+    "rss_kb": peak_rss_kb(),
+    "outcome": outcome
+}))
+"""
+
+def _check_event():
+    return {"pathParameters": {"callsign": "VK3FUR", "timestamp": "2024-09-05T19:07:00Z", "code": "000000.text"},
+            "headers": {}, "requestContext": {"identity": {"sourceIp": "192.0.2.1"}}}
+
+def _verify_payload():
+    """
+    (event, CA PEM) for a /verify that passes, or a non-gzip body if cryptography isn't around to sign one
+    """
+    try:
+        import gzip
+        import tq8_fixtures
+        from cryptography.hazmat.primitives import serialization
+    except ImportError:
+        return {"body": base64.b64encode(b"not a log").decode()}, None
+    ca = tq8_fixtures.TestCA()
+    when = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    log = tq8_fixtures.make_tq8([(ca.issue("VK3FUR"), when)])
+    event = {"body": base64.b64encode(gzip.compress(log.encode())).decode()}
+    return event, ca.cert.public_bytes(serialization.Encoding.PEM).decode()
+
+def payload_for(handler, verify_payload=None):
+    payload = {"handler": handler, "env": {"SECRET": os.environ.get("SECRET", "coldstart-secret"), "UPSTREAMS": "http://127.0.0.1:9"}}
+    if handler.endswith(".verify"):
+        payload["event"], payload["ca_pem"] = verify_payload or _verify_payload()
+    else:
+        payload["event"] = _check_event()
+    return payload
+
+def command(python=sys.executable, image=None):
+    if image:
+        return ["docker", "run", "--rm", "-i", "--network", "none", "--entrypoint", "python", image, "-c", CHILD]
+    return [python, "-c", CHILD]
+
+def run_once(cmd, payload, cwd=None):
+    started = time.perf_counter()
+    result = subprocess.run(cmd, input=json.dumps(payload), capture_output=True, text=True, cwd=cwd,
+                            env={key: value for key, value in os.environ.items() if key != "PYTHONPATH"})
+    wall = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{payload['handler']} child failed:\n{result.stderr}")
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = wall
+    return sample
+
+def summarise(samples):
+    summary = {}
+    for field in ("init_ms", "first_call_ms", "process_ms", "rss_init_kb", "rss_kb"):
+        values = [sample[field] for sample in samples]
+        summary[field] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+    summary["outcomes"] = sorted({sample["outcome"] for sample in samples})
+    return summary
+
+def image_size(image):
+    output = subprocess.run(["docker", "image", "inspect", "-f", "{{.Size}}", image], capture_output=True, text=True, check=True)
+    return int(output.stdout.strip())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start init time and RSS per handler")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="fresh interpreters per handler")
+    parser.add_argument("-H", "--handler", action="append", help=f"handler to measure, default {' and '.join(HANDLERS)}")
+    parser.add_argument("--image", help="run inside this docker image instead of this checkout")
+    parser.add_argument("--python", default=sys.executable, help="interpreter for local runs")
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    cmd = command(args.python, args.image)
+    cwd = None if args.image else os.path.dirname(os.path.abspath(__file__))
+    verify_payload = _verify_payload()
+    results = {"meta": {"image": args.image, "python": None if args.image else args.python, "runs": args.runs}, "handlers": {}}
+    if args.image:
+        results["meta"]["image_bytes"] = image_size(args.image)
+        print(f"image {args.image}: {results['meta']['image_bytes'] / 1024 / 1024:.1f} MiB")
+
+    print(f"{'handler':24} {'init ms':>9} {'1st call ms':>12} {'process ms':>11} {'RSS init MiB':>13} {'RSS MiB':>8}  outcome")
+    for handler in args.handler or HANDLERS:
+        samples = [run_once(cmd, payload_for(handler, verify_payload), cwd) for _ in range(args.runs)]
+        summary = results["handlers"][handler] = summarise(samples)
+        print(f"{handler:24} {summary['init_ms']['median']:9.1f} {summary['first_call_ms']['median']:12.1f} "
+              f"{summary['process_ms']['median']:11.1f} {summary['rss_init_kb']['median'] / 1024:13.1f} "
+              f"{summary['rss_kb']['median'] / 1024:8.1f}  {', '.join(summary['outcomes'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
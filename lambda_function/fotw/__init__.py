@@ -0,0 +1,6 @@
+"""
+Foxes of the World - handlers and helpers behind fotw.xyz
+
+fotw.check is the /check Lambda and only needs hashlib + pyotp. fotw.verify is the /verify Lambda and is
+the only thing that pulls in cryptography. Keep it that way so each function cold starts quickly.
+"""
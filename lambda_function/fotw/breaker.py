@@ -0,0 +1,145 @@
+"""
+Circuit breakers for the fallback upstreams, so a dead or crawling 9dx.cc costs /check nothing instead of a
+timeout per request
+
+Each upstream keeps the calls of the last BREAKER_WINDOW seconds. Once at least BREAKER_MIN_CALLS of them are in
+and BREAKER_FAILURE_RATE of them failed (errors, non-200s, timeouts, or answers slower than BREAKER_SLOW_SECONDS)
+it opens and nothing is sent for BREAKER_OPEN_SECONDS. Then a single probe is let through (half open) - if it's
+fine the breaker closes, otherwise it stays open for another BREAKER_OPEN_SECONDS.
+
+Every state change writes a breaker_transitions EMF count with Upstream and State dimensions when FOTW_METRICS=1.
+"""
+import os
+import time
+import threading
+import collections
+from fotw import metrics
+
+FAILURE_RATE = float(os.environ.get("BREAKER_FAILURE_RATE", 0.5)) # share of recent calls failing that opens it, 0 = never
+MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", 5)) # calls in the window before it can open
+WINDOW = float(os.environ.get("BREAKER_WINDOW", 30)) # seconds of calls looked at
+SLOW_SECONDS = float(os.environ.get("BREAKER_SLOW_SECONDS", 1.0)) # answers slower than this count as failures
+OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", 5)) # between probes while open
+
+class Unavailable(Exception):
+    """
+    No upstream gave an answer - they all failed, timed out or had their breaker open, or there was no time left
+    """
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class Call:
+    """
+    One request let through by a breaker. done() is only counted the first time, so a caller giving up on a slow
+    call can count it as failed without the late answer counting again
+    """
+    def __init__(self, breaker, started, probe):
+        self.breaker = breaker
+        self.started = started
+        self.probe = probe
+        self.finished = False
+
+    def done(self, ok):
+        self.breaker._done(self, ok)
+
+    def discard(self):
+        """
+        Not counted either way, e.g. a hedged copy that another copy to the same upstream beat
+        """
+        self.breaker._discard(self)
+
+class Breaker:
+    def __init__(self, name, failure_rate=FAILURE_RATE, min_calls=MIN_CALLS, window=WINDOW, slow_seconds=SLOW_SECONDS, open_seconds=OPEN_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.calls = collections.deque() # (finished at, failed)
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def call(self):
+        """
+        A Call to report back on, or None if nothing should be sent right now
+        """
+        now = self.clock()
+        with self.lock:
+            if self.state == OPEN:
+                if now - self.opened_at < self.open_seconds:
+                    return None
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probing:
+                    return None
+                self.probing = True
+                return Call(self, now, True)
+        return Call(self, now, False)
+
+    def _done(self, call, ok):
+        now = self.clock()
+        failed = not ok or now - call.started > self.slow_seconds
+        with self.lock:
+            if call.finished:
+                return
+            call.finished = True
+            if call.probe:
+                self.probing = False
+                if self.state == HALF_OPEN and failed:
+                    self._open(now)
+                elif self.state == HALF_OPEN:
+                    self._transition(CLOSED)
+                return
+            if self.state != CLOSED:
+                return # sent before it opened
+            self.calls.append((now, failed))
+            self.failures += failed
+            while self.calls and self.calls[0][0] < now - self.window:
+                self.failures -= self.calls.popleft()[1]
+            if self.failure_rate and len(self.calls) >= self.min_calls and self.failures >= self.failure_rate * len(self.calls):
+                self._open(now)
+
+    def _discard(self, call):
+        with self.lock:
+            if call.finished:
+                return
+            call.finished = True
+            if call.probe:
+                self.probing = False
+
+    def _open(self, now):
+        self.opened_at = now
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        self.calls.clear()
+        self.failures = 0
+        metrics.count("breaker_transitions", Upstream=self.name, State=state)
+
+_breakers = {}
+_lock = threading.Lock()
+
+def get(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(name, Breaker(name, FAILURE_RATE, MIN_CALLS, WINDOW, SLOW_SECONDS, OPEN_SECONDS))
+    return breaker
+
+def states():
+    return {name: breaker.state for name, breaker in _breakers.items()}
+
+def reset():
+    """
+    Forgets every breaker, they all start closed again
+    """
+    with _lock:
+        _breakers.clear()
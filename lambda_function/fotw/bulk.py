@@ -0,0 +1,90 @@
+"""
+Bulk FoTW token computation with NumPy, for analytics and re-checking recorded decodes
+
+    tokens(["VK3FUR", "VK3ABC"], [57518573, 57518574])  # -> int array, shape (2, 2)
+
+HMAC-SHA1 is done as a vectorised SHA-1 over every (callsign, counter) pair at once. The key blocks are
+hashed once per callsign and reused for every counter, then the usual HOTP dynamic truncation.
+Gives exactly what pyotp.HOTP(...).at() gives, just as ints - use format_tokens for the strings.
+"""
+import numpy as np
+from fotw.keys import derive_secret
+
+_H0 = np.array([0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0], dtype=np.uint32)
+_K = [np.uint32(0x5A827999), np.uint32(0x6ED9EBA1), np.uint32(0x8F1BBCDC), np.uint32(0xCA62C1D6)]
+
+def _rotl(x, n):
+    return (x << np.uint32(n)) | (x >> np.uint32(32 - n))
+
+def _compress(state, block):
+    """
+    One SHA-1 compression. state is (5, N) and block (16, N), both uint32 big endian words
+    """
+    w = np.empty((80,) + block.shape[1:], dtype=np.uint32)
+    w[:16] = block
+    for t in range(16, 80):
+        w[t] = _rotl(w[t-3] ^ w[t-8] ^ w[t-14] ^ w[t-16], 1)
+    a, b, c, d, e = state
+    for t in range(80):
+        if t < 20:
+            f = (b & c) | (~b & d)
+        elif t < 40 or t >= 60:
+            f = b ^ c ^ d
+        else:
+            f = (b & c) | (b & d) | (c & d)
+        temp = _rotl(a, 5) + f + e + _K[t // 20] + w[t]
+        e, d, c, b, a = d, c, _rotl(b, 30), a, temp
+    return state + np.stack([a, b, c, d, e])
+
+def _key_block(secrets, pad):
+    # (16, N) words of each secret zero padded to 64 bytes and xored with pad
+    blocks = np.zeros((len(secrets), 64), dtype=np.uint8)
+    for i, secret in enumerate(secrets):
+        if len(secret) > 64:
+            raise ValueError("Secrets longer than a SHA-1 block aren't supported")
+        blocks[i, :len(secret)] = np.frombuffer(secret, dtype=np.uint8)
+    blocks ^= pad
+    return blocks.view(">u4").astype(np.uint32).T
+
+def hotp(secrets, counters, digits=6):
+    """
+    HOTP codes for every secret (raw bytes) at every counter, as an int array of shape (len(secrets), len(counters))
+    """
+    counters = np.asarray(counters, dtype=np.uint64)
+    n_secrets, n_counters = len(secrets), len(counters)
+    n = n_secrets * n_counters
+
+    h0 = np.repeat(_H0[:, None], n_secrets, axis=1)
+    inner = np.repeat(_compress(h0, _key_block(secrets, 0x36)), n_counters, axis=1)
+    outer = np.repeat(_compress(h0, _key_block(secrets, 0x5c)), n_counters, axis=1)
+
+    # second inner block: 8 byte counter, padding, total length 72 bytes
+    block = np.zeros((16, n), dtype=np.uint32)
+    block[0] = np.tile((counters >> np.uint64(32)).astype(np.uint32), n_secrets)
+    block[1] = np.tile((counters & np.uint64(0xFFFFFFFF)).astype(np.uint32), n_secrets)
+    block[2] = 0x80000000
+    block[15] = (64 + 8) * 8
+    inner = _compress(inner, block)
+
+    # second outer block: 20 byte inner digest, padding, total length 84 bytes
+    block = np.zeros((16, n), dtype=np.uint32)
+    block[:5] = inner
+    block[5] = 0x80000000
+    block[15] = (64 + 20) * 8
+    digest = _compress(outer, block)
+
+    # dynamic truncation
+    digest_bytes = np.ascontiguousarray(digest.T, dtype=">u4").view(np.uint8).reshape(n, 20)
+    offset = (digest_bytes[:, 19] & 0xF).astype(np.intp)
+    picked = digest_bytes[np.arange(n)[:, None], offset[:, None] + np.arange(4)].astype(np.uint64)
+    code = ((picked[:, 0] & 0x7F) << 24) | (picked[:, 1] << 16) | (picked[:, 2] << 8) | picked[:, 3]
+    return (code % (10 ** digits)).astype(np.int64).reshape(n_secrets, n_counters)
+
+def tokens(callsigns, counters):
+    """
+    FoTW tokens for every callsign (upper cased like /check does) at every counter
+    """
+    return hotp([derive_secret(callsign.upper()) for callsign in callsigns], counters)
+
+def format_tokens(codes, digits=6):
+    return np.char.zfill(np.asarray(codes).astype(str), digits)
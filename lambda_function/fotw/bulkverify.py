@@ -0,0 +1,132 @@
+"""
+Re-verifies a pile of uploaded .tq8 logs offline, e.g. for an audit or after rotating SECRET
+
+    python -m fotw.bulkverify uploads/ -o results.jsonl
+    python -m fotw.bulkverify uploads.tar.gz --at 2024-10-01T00:00:00Z
+
+Takes a directory (searched recursively) or a tar of .tq8 files, gzipped or not, and runs the same checks as
+/verify against the bundled ca.pem across a process pool. Writes one JSON line per file as they finish:
+    {"file": ..., "callsign": ..., "serial": ..., "outcome": "ok"|"rejected"|"error", "reason": ..., "ms": ...}
+Logs signed with several certs are only "ok" if every group is, and each group's result is listed under "groups".
+A summary of outcomes and the throughput goes to stderr at the end. Doesn't need SECRET or the network.
+"""
+import os
+import sys
+import json
+import time
+import tarfile
+import argparse
+import datetime
+import concurrent.futures
+
+def iter_logs(path):
+    """
+    Yields (name, bytes) for every .tq8 in a directory or tar
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(".tq8"):
+                    full = os.path.join(root, name)
+                    with open(full, "rb") as f:
+                        yield os.path.relpath(full, path), f.read()
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as tar:
+            for member in tar:
+                if member.isfile() and member.name.lower().endswith(".tq8"):
+                    yield member.name, tar.extractfile(member).read()
+    else:
+        raise ValueError(f"{path} is not a directory or tar")
+
+def _init(ca_path):
+    from fotw import verify
+    if ca_path:
+        verify.CA_PATH = ca_path
+        verify.ca.cache_clear()
+        verify._cert_cache.clear() # chain checked against the old CA
+
+def check_one(name, data, now):
+    from fotw import verify
+    result = {"file": name, "callsign": None, "serial": None, "outcome": "ok", "reason": None}
+    started = time.perf_counter()
+    try:
+        if len(data) > verify.VERIFY_MAX_DECOMPRESSED:
+            raise ValueError("Log too large")
+        if data[:2] == b"\x1f\x8b":
+            data = verify.gunzip(data)
+        groups = verify.check_log(data, now=now)
+        for user, _, error in groups:
+            if error is not None and result["reason"] is None:
+                result["outcome"] = "rejected"
+                result["reason"] = str(error)
+        user = next((user for user, _, _ in groups if user is not None), None)
+        if user is not None:
+            result["callsign"] = user.callsign
+            result["serial"] = user.serial
+        if len(groups) > 1:
+            result["groups"] = [
+                {"callsign": user.callsign, "serial": user.serial} if error is None else {"error": str(error)}
+                for user, _, error in groups
+            ]
+    except (ValueError, KeyError) as e:
+        result["outcome"] = "rejected"
+        result["reason"] = str(e)
+    except Exception as e:
+        result["outcome"] = "error"
+        result["reason"] = f"{type(e).__name__}: {e}"
+    result["ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+def run(logs, now=None, workers=os.cpu_count(), ca_path=None):
+    """
+    Yields a result for each (name, bytes) in logs, in the order they finish. workers=0 runs in this process
+    """
+    if not workers:
+        _init(ca_path)
+        for name, data in logs:
+            yield check_one(name, data, now)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(ca_path,)) as pool:
+        pending = set()
+        for name, data in logs:
+            pending.add(pool.submit(check_one, name, data, now))
+            if len(pending) >= workers * 4: # don't read the whole tar into memory up front
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run the /verify checks over a directory or tar of .tq8 logs")
+    parser.add_argument("path", help="directory or tar of .tq8 files")
+    parser.add_argument("-o", "--output", help="write JSONL here instead of stdout")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="processes, 0 to run inline")
+    parser.add_argument("--at", help="check dates as of this ISO time instead of now")
+    parser.add_argument("--ca", help="CA cert to check against (default the bundled ca.pem)")
+    args = parser.parse_args(argv)
+
+    now = datetime.datetime.fromisoformat(args.at) if args.at else datetime.datetime.now(datetime.timezone.utc)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=datetime.timezone.utc)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    counts = {}
+    started = time.perf_counter()
+    try:
+        for result in run(iter_logs(args.path), now=now, workers=args.workers, ca_path=args.ca):
+            counts[result["outcome"]] = counts.get(result["outcome"], 0) + 1
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    summary = ", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items()))
+    print(f"{total} logs in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f}/s) - {summary or 'nothing found'}", file=sys.stderr)
+    return 1 if counts.get("error") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+/check - is this callsign + OTP valid for this timestamp
+"""
+import os
+import base64
+import json
+import math
+import time
+import hashlib
+import datetime
+import functools
+from fotw import metrics, codes, registry
+from fotw.ratelimit import RateLimited
+from fotw.breaker import Unavailable
+from fotw.keys import user_key
+
+BATCH_MAX = int(os.environ.get("BATCH_MAX", 100)) # max checks in a single POST /check
+BATCH_FALLBACK_WORKERS = int(os.environ.get("BATCH_FALLBACK_WORKERS", 16))
+DRIFT_WINDOW = int(os.environ.get("DRIFT_WINDOW", 0)) # also accept codes this many 30 s windows either side
+UPSTREAM_BUDGET = float(os.environ.get("UPSTREAM_BUDGET", 3)) # seconds a /check, or a whole batch, may spend on the fallback
+
+# Cache-Control max-age for GET /check. A local VERIFIED never changes, anything from upstream or UNVERIFIED might
+# once 9dx.cc catches up - and is more likely to the newer the timestamp is
+CACHE_MAX_AGE_VERIFIED = int(os.environ.get("CACHE_MAX_AGE_VERIFIED", 86400))
+CACHE_MAX_AGE_UNVERIFIED = int(os.environ.get("CACHE_MAX_AGE_UNVERIFIED", 60))
+CACHE_MAX_AGE_RECENT = int(os.environ.get("CACHE_MAX_AGE_RECENT", 1))
+# comma separated addresses/CIDRs of the proxies (e.g. CloudFront) whose forwarded for headers are believed
+TRUSTED_PROXIES = os.environ.get("TRUSTED_PROXIES", "")
+CACHE_RECENT_SECONDS = int(os.environ.get("CACHE_RECENT_SECONDS", 300)) # timestamps younger than this get CACHE_MAX_AGE_RECENT
+
+def _counter(timestamp):
+    timestamp_otp = codes.counter(timestamp)
+    if timestamp_otp > datetime.datetime.now(datetime.timezone.utc).timestamp()//30:
+        raise ValueError("Time in future")
+    return timestamp_otp
+
+def _check_local(callsign, timestamp, code):
+    """
+    Returns how many 30 s windows off the local OTP for callsign at timestamp code was (0 = spot on),
+    or None if it doesn't match within DRIFT_WINDOW
+    """
+    timestamp_otp = _counter(timestamp)
+    key = user_key(callsign)
+    if DRIFT_WINDOW:
+        return key.match(int(timestamp_otp), code, DRIFT_WINDOW)
+    return 0 if key.at(int(timestamp_otp)) == code else None
+
+def _check_upstream(callsign, timestamp, code, source_ip=None, deadline=None):
+    """
+    Asks the fallback servers, going via the result cache. Raises RateLimited if callsign or source_ip has
+    used up its fallbacks, cache hits don't count. Raises Unavailable, which isn't cached, if no upstream
+    answered by deadline or their breakers are open
+    """
+    from fotw import upstream, result_cache, ratelimit
+    def fetch():
+        ratelimit.take(callsign, source_ip)
+        try:
+            return upstream.ask(callsign, timestamp, code, deadline)
+        except Unavailable:
+            ratelimit.refund(callsign, source_ip) # not their fault
+            raise
+    # someone else being rate limited shouldn't rate limit everyone waiting on the same answer
+    return result_cache.get_or_fetch(f"{callsign}/{timestamp}/{code}", fetch, retry_on=RateLimited)
+
+@functools.cache
+def _trusted_networks():
+    import ipaddress
+    return tuple(ipaddress.ip_network(proxy.strip(), strict=False) for proxy in TRUSTED_PROXIES.split(",") if proxy.strip())
+
+def _trusted(address):
+    import ipaddress
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_networks())
+
+def _source_ip(event):
+    """
+    The client's address for the per-IP fallback limit. Behind CloudFront, sourceIp is the edge's address - shared
+    by everyone going through that edge - so when sourceIp is one of TRUSTED_PROXIES the viewer's comes from
+    CloudFront-Viewer-Address, or failing that the last X-Forwarded-For hop that isn't a trusted proxy. From
+    anywhere else those headers are whatever the client made up, so it's sourceIp
+    """
+    context = event.get("requestContext") or {}
+    source_ip = (context.get("identity") or context.get("http") or {}).get("sourceIp")
+    if not TRUSTED_PROXIES or not _trusted(source_ip):
+        return source_ip
+    viewer = _header(event, "cloudfront-viewer-address")
+    if viewer:
+        return viewer.rsplit(":", 1)[0].strip("[]") # address:port, IPv6 without brackets
+    forwarded = [hop.strip() for hop in (_header(event, "x-forwarded-for") or "").split(",") if hop.strip()]
+    while forwarded and _trusted(forwarded[-1]):
+        forwarded.pop() # added by our own proxies
+    if forwarded:
+        # last hop a trusted proxy saw, anything before it is whatever the client claimed
+        return forwarded[-1]
+    return source_ip
+
+def _max_age(local, timestamp):
+    if local:
+        return CACHE_MAX_AGE_VERIFIED
+    age = datetime.datetime.now(datetime.timezone.utc).timestamp() - datetime.datetime.fromisoformat(timestamp).timestamp()
+    if age < CACHE_RECENT_SECONDS:
+        return CACHE_MAX_AGE_RECENT
+    return CACHE_MAX_AGE_UNVERIFIED
+
+def _header(event, name):
+    # API Gateway keeps whatever case the client sent
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+def _not_modified(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _cacheable(event, response, max_age):
+    """
+    Adds Cache-Control and ETag to a /check response, and turns it into a 304 if the client already has it
+    """
+    etag = '"' + hashlib.sha256(response["body"].encode()).hexdigest()[:16] + '"'
+    response["headers"]["Cache-Control"] = f"public, max-age={max_age}"
+    response["headers"]["ETag"] = etag
+    if _not_modified(_header(event, "if-none-match"), etag):
+        response["statusCode"] = 304
+        response["body"] = ""
+    return response
+
+@metrics.instrumented("validate")
+def validate(event, context, metric):
+    """
+    Checks if a callsign + OTP is valid for a timestamp
+    """
+    deadline = time.monotonic() + UPSTREAM_BUDGET
+    path = event["pathParameters"]
+    callsign, timestamp, code = codes.normalise(path["callsign"], path["timestamp"], path["code"])
+
+    unavailable = None
+    registered = registry.is_registered(callsign)
+    offset = None
+    if registered:
+        with metric.stage("hotp"):
+            offset = _check_local(callsign, timestamp, code)
+    else:
+        _counter(timestamp) # future timestamps are still rejected before anything goes upstream
+        metric.set(registered=False)
+    if offset is None: # try to validate against https://www.9dx.cc and friends
+        try:
+            with metric.stage("upstream"):
+                contents = _check_upstream(callsign, timestamp, code, _source_ip(event), deadline)
+        except RateLimited as e:
+            contents, retry_after = None, e.retry_after
+        except Unavailable as e:
+            contents, unavailable = f"{callsign} UNVERIFIED", str(e)
+        if not registered and (contents is None or not codes.is_verified(contents)):
+            # they may have registered since the index was built
+            metric.count("hotp_backstop")
+            with metric.stage("hotp"):
+                offset = _check_local(callsign, timestamp, code)
+        elif not registered:
+            metric.count("hotp_skipped")
+
+    if offset is not None:
+        metric.result("verified_local")
+        metric.set(drift=offset)
+        return _cacheable(event, {
+            "body": f"{callsign} VERIFIED",
+            "statusCode": 200,
+            "headers": {
+                "Content-Type": "text/plain",
+                "X-FoTW-Drift": str(offset)
+            }
+        }, _max_age(True, timestamp))
+    if contents is None:
+        metric.result("rate_limited")
+        return {
+            "body": f"{callsign} UNVERIFIED",
+            "statusCode": 429,
+            "headers": {
+                "Content-Type": "text/plain",
+                "Retry-After": str(math.ceil(retry_after)),
+                "Cache-Control": "no-store"
+            }
+        }
+    if unavailable is not None:
+        # answered straight away while 9dx.cc is down or slow, but don't let anything cache it
+        metric.result("upstream_unavailable")
+        metric.set(upstream=unavailable)
+        return {
+            "body": contents,
+            "statusCode": 200,
+            "headers": {
+                "Content-Type": "text/plain",
+                "Cache-Control": "no-store"
+            }
+        }
+    metric.result("verified_upstream" if codes.is_verified(contents) else "unverified")
+    return _cacheable(event, {
+        "body": contents,
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "text/plain"
+        }
+    }, _max_age(False, timestamp))
+
+@metrics.instrumented("validate_batch")
+def validate_batch(event, context, metric):
+    """
+    Checks a JSON list of {callsign, timestamp, code} in one go. Local misses are sent to 9dx.cc concurrently
+    """
+    deadline = time.monotonic() + UPSTREAM_BUDGET
+    body = event['body']
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+    checks = json.loads(body)
+
+    if not isinstance(checks, list):
+        raise ValueError("Expected a list of checks")
+    if len(checks) > BATCH_MAX:
+        raise ValueError("Too many checks in batch")
+
+    results = []
+    misses = []
+    unregistered = []
+    for check in checks:
+        # a malformed entry is an error for that entry, not the whole batch
+        if not isinstance(check, dict):
+            results.append({"status": "ERROR", "error": "Expected an object with callsign, timestamp and code"})
+            continue
+        missing = [field for field in ("callsign", "timestamp", "code") if field not in check]
+        if missing:
+            results.append({"status": "ERROR", "error": f"Missing {', '.join(missing)}"})
+            continue
+        callsign, timestamp, code = codes.normalise(check["callsign"], check["timestamp"], check["code"])
+        result = {
+            "callsign": callsign,
+            "timestamp": timestamp,
+            "code": code
+        }
+        results.append(result)
+        try:
+            if registry.is_registered(callsign):
+                with metric.stage("hotp"):
+                    offset = _check_local(callsign, timestamp, code)
+            else:
+                _counter(timestamp)
+                offset = None
+                unregistered.append(result)
+        except ValueError as e:
+            result["status"] = "ERROR"
+            result["error"] = str(e)
+            continue
+        if offset is not None:
+            result["status"] = "VERIFIED"
+            result["drift"] = offset
+        else:
+            misses.append(result)
+
+    metric.set(checks=len(checks), local_misses=len(misses), unregistered=len(unregistered))
+    if misses:
+        import concurrent.futures
+        source_ip = _source_ip(event)
+        def fallback(result):
+            try:
+                contents = _check_upstream(result["callsign"], result["timestamp"], result["code"], source_ip, deadline)
+            except RateLimited:
+                result["status"] = "UNVERIFIED"
+                result["error"] = "Rate limited"
+                return
+            except Unavailable:
+                result["status"] = "UNVERIFIED"
+                result["error"] = "Upstream unavailable"
+                return
+            result["status"] = "VERIFIED" if codes.is_verified(contents) else "UNVERIFIED"
+        with metric.stage("upstream"), concurrent.futures.ThreadPoolExecutor(max_workers=min(len(misses), BATCH_FALLBACK_WORKERS)) as executor:
+            list(executor.map(fallback, misses))
+        # unregistered as of the index, the fallback didn't know them either - maybe they've registered since
+        for result in unregistered:
+            if result["status"] == "VERIFIED":
+                metric.count("hotp_skipped")
+            else:
+                metric.count("hotp_backstop")
+                with metric.stage("hotp"):
+                    offset = _check_local(result["callsign"], result["timestamp"], result["code"])
+                if offset is not None:
+                    result.pop("error", None)
+                    result["status"] = "VERIFIED"
+                    result["drift"] = offset
+
+    return {
+        "body": json.dumps(results),
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json"
+        }
+    }
@@ -0,0 +1,146 @@
+"""
+asyncio client for checking lots of decodes against /check, for spot aggregators and the like
+
+    async with Client("https://fotw.xyz", max_connections=8) as client:
+        ok = await client.check("VK3FUR", "2024-09-05T19:07:00Z", "123456")
+        results = await client.check_many(decodes)
+
+Keeps up to max_connections HTTP/1.1 keep-alive connections and never has more requests than that in flight.
+Identical checks already in flight share one request. Operators holding SECRET can pass it to have matching
+codes verified locally without touching the network - anything that doesn't match still goes to the server,
+which also knows about 9dx.cc. Standard library only, apart from pyotp for the local check.
+"""
+import ssl
+import base64
+import asyncio
+import datetime
+import urllib.parse
+from fotw import codes
+
+class ClientError(Exception):
+    def __init__(self, status, body, retry_after=None):
+        super().__init__(f"/check returned {status}: {body.strip()[:200]}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+class Client:
+    def __init__(self, base_url="https://fotw.xyz", max_connections=8, timeout=5.0, secret=None, drift=0):
+        url = urllib.parse.urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.prefix = url.path.rstrip("/")
+        self.netloc = url.netloc
+        self.timeout = timeout
+        self.secret = secret
+        self.drift = drift
+        self.max_connections = max_connections
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle = []
+        self._inflight = {}
+        self._hotp = {}
+        self.stats = {"local": 0, "requests": 0, "shared": 0, "connections": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for reader, writer in idle:
+            writer.close()
+
+    def _local(self, callsign, timestamp, code):
+        if self.secret is None:
+            return False
+        import pyotp
+        counter = codes.counter(timestamp)
+        if counter > datetime.datetime.now(datetime.timezone.utc).timestamp() // 30:
+            return False # let the server say what it thinks of that
+        hotp = self._hotp.get(callsign)
+        if hotp is None:
+            hotp = self._hotp[callsign] = pyotp.HOTP(base64.b32encode(codes.derive_secret(self.secret, callsign)))
+        return any(hotp.at(counter + offset) == code for offset in range(-self.drift, self.drift + 1))
+
+    async def check(self, callsign, timestamp, code):
+        """
+        True if callsign + code is VERIFIED for timestamp. Raises ClientError for anything but a 200
+        """
+        callsign, timestamp, code = codes.normalise(callsign, timestamp, code)
+        if self._local(callsign, timestamp, code):
+            self.stats["local"] += 1
+            return True
+        key = (callsign, timestamp, code)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(codes.check_path(callsign, timestamp, code)))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["shared"] += 1
+        return codes.is_verified(await asyncio.shield(task))
+
+    async def check_many(self, checks, return_exceptions=False):
+        """
+        check() for each (callsign, timestamp, code), results in the same order
+        """
+        return await asyncio.gather(*(self.check(*check) for check in checks), return_exceptions=return_exceptions)
+
+    async def _fetch(self, path):
+        async with self._slots:
+            for attempt in range(2):
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await self._connect()
+                try:
+                    status, headers, body = await asyncio.wait_for(self._request(reader, writer, self.prefix + path), self.timeout)
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue # server probably closed the idle connection on us
+                    raise
+                if headers.get("connection", "").lower() == "close":
+                    writer.close()
+                else:
+                    self._idle.append((reader, writer))
+                self.stats["requests"] += 1
+                if status != 200:
+                    raise ClientError(status, body, headers.get("retry-after"))
+                return body
+
+    async def _connect(self):
+        self.stats["connections"] += 1
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl, server_hostname=self.host if self.ssl else None),
+            self.timeout
+        )
+
+    async def _request(self, reader, writer, path):
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.netloc}\r\nAccept: text/plain\r\nConnection: keep-alive\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            body = b""
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read() # ends when the server hangs up
+            headers["connection"] = "close"
+        return status, headers, body.decode(errors="replace")
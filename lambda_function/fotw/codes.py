@@ -0,0 +1,28 @@
+"""
+Callsign / timestamp / code handling shared by /check, the upstream fallback and fotw.client. Doesn't need SECRET
+"""
+import hashlib
+import datetime
+import urllib.parse
+
+def normalise(callsign, timestamp, code):
+    """
+    What /check actually compares - upper case callsign, code without the .text WSJT-X tacks on
+    """
+    return str(callsign).upper(), str(timestamp), str(code).replace(".text", "")
+
+def counter(timestamp):
+    """
+    HOTP counter for an ISO timestamp, one per 30 s
+    """
+    return int(datetime.datetime.fromisoformat(timestamp).timestamp() // 30)
+
+def check_path(callsign, timestamp, code):
+    return "/check/" + "/".join(urllib.parse.quote(part, safe=":") for part in (callsign, timestamp, code)) + ".text"
+
+def is_verified(body):
+    return body.strip().endswith(" VERIFIED")
+
+def derive_secret(secret, callsign):
+    # WSJTX requires 16 base32 digits = 80 bits of data (5*16) = 10 bytes
+    return hashlib.sha3_512((secret + callsign).encode()).digest()[:10]
@@ -0,0 +1,75 @@
+"""
+Per-callsign secrets derived from SECRET, shared by /check and /verify
+"""
+import os
+import base64
+import threading
+import functools
+import pyotp
+from fotw import codes
+
+SECRET = os.environ["SECRET"]
+
+KEY_CACHE_SIZE = int(os.environ.get("KEY_CACHE_SIZE", 4096)) # callsigns kept warm per container
+TOKENS_KEPT = 32 # tokens remembered per callsign, centred on the last counter asked for
+
+if len(SECRET) < 10:
+    raise ValueError("SECRET too small")
+
+token_cache_stats = {"hits": 0, "misses": 0}
+
+def derive_secret(callsign):
+    return codes.derive_secret(SECRET, callsign)
+
+class UserKey:
+    """
+    Derived secret and HOTP state for a callsign. Remembers tokens for counters near the last one asked for
+    so a rolling drift window only costs one new HMAC per 30 s. Shared between threads by the server
+    """
+    def __init__(self, callsign):
+        self.secret = derive_secret(callsign)
+        self.secret_b32 = base64.b32encode(self.secret)
+        self.hotp = pyotp.HOTP(self.secret_b32)
+        self.tokens = {}
+        self.window = (None, {}) # (counter, drift), {token: offset} - swapped in as one so they always match
+        self.lock = threading.Lock()
+
+    def at(self, counter):
+        with self.lock:
+            token = self.tokens.get(counter)
+        if token is not None:
+            token_cache_stats["hits"] += 1
+            return token
+        token_cache_stats["misses"] += 1
+        token = self.hotp.at(counter) # outside the lock, worst case two threads work out the same token
+        with self.lock:
+            self.tokens[counter] = token
+            if len(self.tokens) > TOKENS_KEPT:
+                for old in [old for old in self.tokens if abs(old - counter) > TOKENS_KEPT // 2]:
+                    del self.tokens[old]
+        return token
+
+    def match(self, counter, code, drift):
+        """
+        Offset from counter (-drift..drift) that code is the token for, or None
+        """
+        key, window = self.window
+        if key != (counter, drift):
+            # furthest first so the closest offset wins if two tokens collide
+            window = {self.at(counter + offset): offset for offset in sorted(range(-drift, drift + 1), key=abs, reverse=True)}
+            self.window = ((counter, drift), window)
+        return window.get(code)
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def user_key(callsign):
+    return UserKey(callsign)
+
+def key_cache_info():
+    """
+    Hit/miss counters for the per-callsign key cache and the per-window token cache
+    """
+    info = user_key.cache_info()
+    return {
+        "keys": {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize},
+        "tokens": dict(token_cache_stats)
+    }
@@ -0,0 +1,144 @@
+"""
+Per-invocation stage timings, written to stdout as CloudWatch Embedded Metric Format (EMF) JSON lines
+
+Off unless FOTW_METRICS=1. When off, start() hands back a shared do-nothing record so the handlers only
+pay for a couple of no-op method calls.
+
+    metric = metrics.start("verify")
+    with metric.stage("decode"):
+        ...
+    metric.finish("ok")
+"""
+import os
+import sys
+import json
+import time
+import functools
+import contextlib
+from fotw import profiling
+
+ENABLED = os.environ.get("FOTW_METRICS", "") not in ("", "0")
+NAMESPACE = os.environ.get("FOTW_METRICS_NAMESPACE", "FoTW")
+
+class Record:
+    def __init__(self, handler):
+        self.handler = handler
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.properties = {}
+        self.counts = {}
+        self.outcome = "ok"
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + (time.perf_counter() - started) * 1000
+
+    def set(self, **properties):
+        self.properties.update(properties)
+
+    def count(self, name, n=1):
+        """
+        Adds to a Count metric on this invocation's line
+        """
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def result(self, outcome):
+        self.outcome = outcome
+
+    def finish(self, outcome, reason=None):
+        total = (time.perf_counter() - self.started) * 1000
+        values = {f"{name}_ms": round(value, 3) for name, value in self.stages.items()}
+        values["total_ms"] = round(total, 3)
+        line = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["Handler", "Outcome"]],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in values] +
+                        [{"Name": name, "Unit": "Count"} for name in self.counts]
+                }]
+            },
+            "Handler": self.handler,
+            "Outcome": outcome,
+            **values,
+            **self.counts,
+            **self.properties
+        }
+        if reason is not None:
+            line["Reason"] = reason
+        emit(line)
+
+class NullRecord:
+    outcome = "ok"
+    _stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._stage
+
+    def set(self, **properties):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def result(self, outcome):
+        pass
+
+    def finish(self, outcome, reason=None):
+        pass
+
+NULL = NullRecord()
+
+def emit(line):
+    sys.stdout.write(json.dumps(line) + "\n")
+    sys.stdout.flush()
+
+def count(name, **dimensions):
+    """
+    A one off EMF count outside any invocation record, e.g. a breaker changing state
+    """
+    if not ENABLED:
+        return
+    emit({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{"Name": name, "Unit": "Count"}]
+            }]
+        },
+        **dimensions,
+        name: 1
+    })
+
+def start(handler):
+    return Record(handler) if ENABLED else NULL
+
+def instrumented(handler):
+    """
+    Decorator for handlers taking (event, context, metric). Finishes the record with "rejected" and the
+    exception message when the handler raises, otherwise with whatever metric.result() it gave. Invocations
+    picked by profiling.sampled() run under the profiler
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(event, context):
+            metric = start(handler)
+            try:
+                if profiling.sampled(event):
+                    response = profiling.run(handler, fn, event, context, metric)
+                else:
+                    response = fn(event, context, metric)
+            except Exception as e:
+                metric.finish("rejected" if isinstance(e, (ValueError, KeyError)) else "error", str(e))
+                raise
+            metric.finish(metric.outcome)
+            return response
+        return run
+    return wrap
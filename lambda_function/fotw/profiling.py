@@ -0,0 +1,178 @@
+"""
+Opt-in cProfile + tracemalloc for a sample of handler invocations, written to the log stream as one JSON line each
+
+    FOTW_PROFILE_RATE=0.01   profile 1% of invocations
+    {"fotwProfile": true}    in a test event (console / aws lambda invoke) profiles that one
+
+Each sampled call logs {"fotw_profile": handler, "ms", "peak_kb", "functions": [[where, calls, own_ms, cumulative_ms]..],
+"allocations": [[where, kb, blocks]..]} with the top FOTW_PROFILE_TOP of each. Unsampled calls only pay for a
+random() and a dict lookup.
+
+tracemalloc is process wide, so only one call is profiled at a time - a sampled call that comes in while another is
+being profiled (fotw.server runs handlers on a thread pool) just runs normally. Allocations by other threads while a
+profile is going still show up in its snapshot.
+
+    python -m fotw.profiling merge cloudwatch-export.txt [-k verify] [--json]
+
+adds up every profile line it can find (anything before the first { on a line is ignored) into one report. Each
+sample only has its own top N so rarely hot functions are undercounted.
+"""
+import os
+import sys
+import json
+import time
+import random
+import threading
+
+RATE = float(os.environ.get("FOTW_PROFILE_RATE", 0))
+TOP = int(os.environ.get("FOTW_PROFILE_TOP", 20))
+TRACE_FRAMES = 1
+
+_profiling = threading.Lock() # held by whichever call is being profiled
+
+def sampled(event):
+    if RATE and random.random() < RATE:
+        return True
+    return isinstance(event, dict) and bool(event.get("fotwProfile"))
+
+def _where(filename, line, name):
+    # last two path parts is enough to tell fotw/verify.py from cryptography/x509/base.py
+    parts = filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(parts[-2:])}:{line}({name})"
+
+def run(handler, fn, *args):
+    """
+    Calls fn(*args) under cProfile and tracemalloc and emits the summary, even if fn raises. If another call is
+    already being profiled it's just called. Nothing that goes wrong profiling gets to the caller
+    """
+    if not _profiling.acquire(blocking=False):
+        return fn(*args)
+    try:
+        return _run(handler, fn, *args)
+    finally:
+        _profiling.release()
+
+def _run(handler, fn, *args):
+    import cProfile
+    import tracemalloc
+    from fotw import metrics
+    profile = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(TRACE_FRAMES)
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        profile.enable()
+    except ValueError: # some other profiler already has the hook
+        profile = None
+    try:
+        return fn(*args)
+    finally:
+        if profile is not None:
+            profile.disable()
+        elapsed = (time.perf_counter() - started) * 1000
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            peak = tracemalloc.get_traced_memory()[1]
+            metrics.emit(summarise(handler, profile, snapshot, elapsed, peak))
+        except Exception as e: # e.g. something else stopped tracemalloc, the response matters more than the profile
+            print(f"fotw profile for {handler} failed: {e!r}", file=sys.stderr)
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+def summarise(handler, profile, snapshot, elapsed, peak):
+    functions = []
+    if profile is not None:
+        import pstats
+        stats = pstats.Stats(profile).stats
+        for (filename, line, name), (_, calls, own, cumulative, _) in sorted(stats.items(), key=lambda item: -item[1][2])[:TOP]:
+            functions.append([_where(filename, line, name), calls, round(own * 1000, 3), round(cumulative * 1000, 3)])
+    allocations = []
+    for stat in snapshot.statistics("lineno")[:TOP]:
+        frame = stat.traceback[0]
+        allocations.append([_where(frame.filename, frame.lineno, ""), round(stat.size / 1024, 1), stat.count])
+    return {
+        "fotw_profile": handler,
+        "ms": round(elapsed, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "functions": functions,
+        "allocations": allocations
+    }
+
+def iter_profiles(lines):
+    for line in lines:
+        start = line.find("{")
+        if start == -1 or "fotw_profile" not in line:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and "fotw_profile" in record:
+            yield record
+
+def merge(profiles):
+    """
+    Adds profiles up per handler. Functions and allocation sites are summed over the samples they showed up in
+    """
+    report = {}
+    for profile in profiles:
+        entry = report.setdefault(profile["fotw_profile"], {"samples": 0, "ms": 0, "peak_kb_max": 0, "functions": {}, "allocations": {}})
+        entry["samples"] += 1
+        entry["ms"] += profile["ms"]
+        entry["peak_kb_max"] = max(entry["peak_kb_max"], profile["peak_kb"])
+        for where, calls, own, cumulative in profile["functions"]:
+            total = entry["functions"].setdefault(where, [0, 0, 0, 0])
+            total[0] += calls
+            total[1] += own
+            total[2] += cumulative
+            total[3] += 1
+        for where, kb, blocks in profile["allocations"]:
+            total = entry["allocations"].setdefault(where, [0, 0, 0])
+            total[0] += kb
+            total[1] += blocks
+            total[2] += 1
+    return report
+
+def print_report(report, top, out=None):
+    out = out or sys.stdout
+    for handler, entry in sorted(report.items()):
+        print(f"{handler}: {entry['samples']} samples, {entry['ms'] / entry['samples']:.1f} ms average, peak {entry['peak_kb_max']:.0f} kB", file=out)
+        print(f"  {'own ms':>10} {'cum ms':>10} {'calls':>9} {'seen':>5}  function", file=out)
+        for where, (calls, own, cumulative, seen) in sorted(entry["functions"].items(), key=lambda item: -item[1][1])[:top]:
+            print(f"  {own:10.2f} {cumulative:10.2f} {calls:9} {seen:5}  {where}", file=out)
+        print(f"  {'kB':>10} {'blocks':>10} {'seen':>5}  allocated at", file=out)
+        for where, (kb, blocks, seen) in sorted(entry["allocations"].items(), key=lambda item: -item[1][0])[:top]:
+            print(f"  {kb:10.1f} {blocks:10} {seen:5}  {where}", file=out)
+        print(file=out)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Merge FoTW profile log lines into one report")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    merge_parser = subcommands.add_parser("merge", help="add up profile lines from log files (or stdin)")
+    merge_parser.add_argument("files", nargs="*", help="log files, default stdin")
+    merge_parser.add_argument("-k", dest="handler", help="only this handler")
+    merge_parser.add_argument("-n", "--top", type=int, default=25, help="rows per table")
+    merge_parser.add_argument("--json", action="store_true", help="print the merged report as JSON")
+    args = parser.parse_args(argv)
+
+    def lines():
+        if not args.files:
+            yield from sys.stdin
+        for name in args.files:
+            with open(name, errors="replace") as f:
+                yield from f
+    profiles = (profile for profile in iter_profiles(lines()) if args.handler in (None, profile["fotw_profile"]))
+    report = merge(profiles)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report, args.top)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Token buckets in front of the 9dx.cc fallback, so a stuck client or a flood of bogus codes can't turn every
+/check into an outbound request
+
+Each callsign gets FALLBACK_BURST tokens that refill at FALLBACK_RATE a second, each source IP FALLBACK_IP_BURST
+refilling at FALLBACK_IP_RATE. A fallback costs one token from both. Only the upstream path is limited - local
+HOTP hits and result cache hits are free. A rate of 0 turns that limit off.
+"""
+import os
+import time
+import threading
+import collections
+
+RATE = float(os.environ.get("FALLBACK_RATE", 1)) # tokens per second, per callsign
+BURST = float(os.environ.get("FALLBACK_BURST", 10))
+IP_RATE = float(os.environ.get("FALLBACK_IP_RATE", 10)) # per source IP, higher as one client may check lots of calls
+IP_BURST = float(os.environ.get("FALLBACK_IP_BURST", 100))
+MAX_KEYS = int(os.environ.get("FALLBACK_LIMITER_KEYS", 10000)) # buckets kept, least recently used go first
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class Limiter:
+    """
+    Buckets are a [tokens, last refill] pair per key in an LRU ordered dict. An evicted bucket comes back full,
+    which only ever errs towards letting a request through
+    """
+    def __init__(self, rate=RATE, burst=BURST, max_keys=MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def _bucket(self, key, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.burst, now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def take(self, key, now=None):
+        """
+        Takes a token from key's bucket, raises RateLimited if it's empty
+        """
+        if not self.rate:
+            return
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            bucket = self._bucket(key, now)
+            if bucket[0] < 1:
+                raise RateLimited((1 - bucket[0]) / self.rate)
+            bucket[0] -= 1
+
+    def refund(self, key):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + 1)
+
+def reset():
+    """
+    Starts every bucket over, full
+    """
+    global callsigns, ips
+    callsigns = Limiter(RATE, BURST)
+    ips = Limiter(IP_RATE, IP_BURST)
+
+reset()
+
+def take(callsign, source_ip=None):
+    """
+    Charges one fallback to callsign and source_ip, or to neither and raises RateLimited
+    """
+    callsigns.take(callsign)
+    if source_ip:
+        try:
+            ips.take(source_ip)
+        except RateLimited:
+            callsigns.refund(callsign)
+            raise
+
+def refund(callsign, source_ip=None):
+    """
+    Gives back what take() charged, for fallbacks that never got an answer
+    """
+    callsigns.refund(callsign)
+    if source_ip:
+        ips.refund(source_ip)
@@ -0,0 +1,160 @@
+"""
+Which callsigns /verify has ever handed a secret to, so /check can skip the local HOTP for everyone else and send
+them straight to the fallback
+
+/verify appends "<time> <callsign> <cert serial>" to ISSUANCE_LOG for every callsign it issues.
+
+    python -m fotw.registry build issuance.log registry.idx
+
+turns the log into a sortedindex of 8 byte SHA-256 prefixes of the callsigns, tagged with how far into the log it
+got. /check maps REGISTRY_INDEX and, if it can read ISSUANCE_LOG too, adds whatever was appended after the
+index was built. Every REGISTRY_CHECK_SECONDS it picks up a rebuilt index and reads on from where it got to in the
+log, so new registrations reach warm containers without a rebuild. With no index configured everyone counts as
+registered.
+
+Registrations /check hasn't seen yet (it can't read the log, or it's between checks) aren't in it, so /check
+still runs the local HOTP before answering UNVERIFIED for an unregistered callsign. A stale index only loses the
+short cut, never a VERIFIED.
+
+That's the trade-off: the HOTP is only saved when the fallback says VERIFIED. Anything else from it (UNVERIFIED,
+rate limited, unavailable) still gets the HOTP, after waiting on the fallback, and a callsign /check hasn't seen
+register yet waits on the fallback before its local VERIFIED. With FOTW_METRICS on, /check counts hotp_skipped and
+hotp_backstop per invocation so you can see which way it's going for your traffic.
+"""
+import os
+import sys
+import time
+import hashlib
+import threading
+from fotw import sortedindex
+
+ISSUANCE_LOG = os.environ.get("ISSUANCE_LOG") # file /verify appends issued callsigns to, unset = not recorded
+REGISTRY_INDEX = os.environ.get("REGISTRY_INDEX") # built by python -m fotw.registry build, unset = everyone's registered
+REGISTRY_CHECK_SECONDS = float(os.environ.get("REGISTRY_CHECK_SECONDS", 10)) # how often to look for a new index and log lines
+KEY_BYTES = 8 # plenty for a few hundred thousand callsigns, a collision only costs the short cut
+
+def key(callsign):
+    return hashlib.sha256(callsign.upper().encode()).digest()[:KEY_BYTES]
+
+def record(issued, path=None):
+    """
+    Appends (callsign, cert serial) pairs to the issuance log. Returns False if it couldn't be written
+    """
+    path = path or ISSUANCE_LOG
+    if not path:
+        return True
+    when = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    lines = "".join(f"{when} {callsign} {serial}\n" for callsign, serial in issued).encode()
+    try:
+        # one write with O_APPEND so lines from concurrent writers don't interleave
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines)
+        finally:
+            os.close(fd)
+    except OSError:
+        return False
+    return True
+
+def read_log(path, offset=0):
+    """
+    Returns (set of keys, offset after the last complete line) for the log from offset on
+    """
+    keys = set()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break # still being written
+            offset += len(line)
+            fields = line.split()
+            if len(fields) >= 2:
+                keys.add(key(fields[1].decode(errors="replace")))
+    return keys, offset
+
+def build(log_path, index_path):
+    """
+    Rebuilds the index from the whole log. Returns how many callsigns are in it
+    """
+    keys, offset = read_log(log_path)
+    return sortedindex.build(index_path, keys, KEY_BYTES, tag=offset)
+
+class _Registry:
+    """
+    The index plus keys from log lines after it, both refreshed at most every check_every seconds
+    """
+    def __init__(self, index_path, log_path, check_every):
+        self.watched = sortedindex.Watched(index_path, check_every)
+        self.log_path = log_path
+        self.check_every = check_every
+        self.index = None
+        self.recent = set()
+        self.offset = 0
+        self.checked = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        (index, recent keys), or None if there's no usable index
+        """
+        index = self.watched.get()
+        if index is None or index.width != KEY_BYTES:
+            return None # better the HOTP for everyone than sending registered callsigns upstream first
+        if self._stale(index):
+            with self.lock:
+                if not self._stale(index):
+                    return self.index, self.recent
+                if index is not self.index:
+                    # rebuilt, it covers the log up to its tag
+                    self.index, self.recent, self.offset = index, set(), index.tag
+                if self.log_path:
+                    try:
+                        keys, self.offset = read_log(self.log_path, self.offset)
+                        self.recent = self.recent | keys # readers may be iterating the old set
+                    except OSError:
+                        pass
+                self.checked = time.monotonic()
+        return self.index, self.recent
+
+    def _stale(self, index):
+        return index is not self.index or self.checked is None or time.monotonic() - self.checked >= self.check_every
+
+_registry = None
+
+def reload():
+    """
+    Forgets the loaded index and log position, the next lookup starts over
+    """
+    global _registry
+    _registry = None
+
+def is_registered(callsign):
+    global _registry
+    if not REGISTRY_INDEX:
+        return True
+    registry = _registry
+    if registry is None or registry.watched.path != REGISTRY_INDEX:
+        registry = _registry = _Registry(REGISTRY_INDEX, ISSUANCE_LOG, REGISTRY_CHECK_SECONDS)
+    loaded = registry.get()
+    if loaded is None:
+        return True
+    index, recent = loaded
+    callsign_key = key(callsign)
+    return callsign_key in recent or callsign_key in index
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the registered callsign index from the issuance log")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build_parser = subcommands.add_parser("build", help="(re)build the index from the whole log")
+    build_parser.add_argument("log", help="issuance log")
+    build_parser.add_argument("index", help="index to write, replaced atomically")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    count = build(args.log, args.index)
+    print(f"{count} callsigns -> {args.index} in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return count
+
+if __name__ == "__main__":
+    main()
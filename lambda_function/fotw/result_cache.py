@@ -0,0 +1,127 @@
+"""
+Caches upstream check answers so repeat lookups of the same callsign/timestamp/code don't go back out to 9dx.cc
+
+VERIFIED and UNVERIFIED answers get their own TTL. Concurrent lookups of the same key share a single
+upstream request. RESULT_CACHE picks the backend - "memory" (default), "sqlite:/path/to/db" or "none"
+"""
+import os
+import time
+import sqlite3
+import threading
+import concurrent.futures
+from fotw import codes
+
+TTL_VERIFIED = float(os.environ.get("RESULT_CACHE_TTL_VERIFIED", 3600))
+TTL_UNVERIFIED = float(os.environ.get("RESULT_CACHE_TTL_UNVERIFIED", 30))
+MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 10000))
+
+class MemoryBackend:
+    """
+    In process dict. Oldest entries are dropped once MAX_ENTRIES is reached
+    """
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.time():
+            with self.lock:
+                self.entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries.pop(key, None)
+            while len(self.entries) >= self.max_entries:
+                del self.entries[next(iter(self.entries))]
+            self.entries[key] = (value, time.time() + ttl)
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+class SQLiteBackend:
+    """
+    Single table sqlite file. Handy for testing locally or sharing between processes
+    """
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._db() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _db(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=5)
+        return db
+
+    def get(self, key):
+        row = self._db().execute("SELECT value FROM results WHERE key = ? AND expires >= ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)", (key, value, time.time() + ttl))
+            db.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+
+def backend_from_config(config):
+    if config == "memory":
+        return MemoryBackend()
+    if config == "none":
+        return NullBackend()
+    if config.startswith("sqlite:"):
+        return SQLiteBackend(config[len("sqlite:"):])
+    raise ValueError(f"Unknown RESULT_CACHE backend {config}")
+
+backend = backend_from_config(os.environ.get("RESULT_CACHE", "memory"))
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def ttl_for(value):
+    return TTL_VERIFIED if codes.is_verified(value) else TTL_UNVERIFIED
+
+def get_or_fetch(key, fetch, retry_on=()):
+    """
+    Returns the cached answer for key, or calls fetch() to get one. Only one fetch per key runs at a time,
+    everyone else asking for that key waits on it. If the fetch they waited on raised one of retry_on - something
+    about whoever was fetching rather than the answer, like their rate limit - they go again with their own fetch
+    """
+    while True:
+        value = backend.get(key)
+        if value is not None:
+            return value
+
+        with _inflight_lock:
+            future = _inflight.get(key)
+            leader = future is None
+            if leader:
+                future = _inflight[key] = concurrent.futures.Future()
+        if leader:
+            break
+        try:
+            return future.result()
+        except retry_on:
+            continue
+
+    try:
+        value = fetch()
+        backend.set(key, value, ttl_for(value))
+        future.set_result(value)
+        return value
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
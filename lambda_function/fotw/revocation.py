@@ -0,0 +1,107 @@
+"""
+Revoked LoTW certs, checked by /verify against a sortedindex so nothing parses a CRL per request
+
+    python -m fotw.revocation build revoked.txt --crl lotw.crl -o revocation.idx
+
+revoked.txt has one cert per line, "serial 1234" (or 0x4d2) or "sha256 <hex SHA-256 of the DER>", # for comments.
+--crl adds every serial on a CRL (PEM or DER), that part needs cryptography. The index holds 32 byte keys - SHA-256
+fingerprints as they are and serials hashed so they're the same width.
+
+/verify maps REVOCATION_INDEX and stats it at most every REVOCATION_CHECK_SECONDS. Build a new one over the top
+(it's renamed into place) and warm containers pick it up. If the file is missing or broken the last good one is
+kept. With none loaded at all every cert is rejected with "Revocation list unavailable" (and the verify metric line
+says revocation=unavailable) rather than letting revoked ones through.
+"""
+import os
+import sys
+import time
+import hashlib
+from fotw import sortedindex
+
+REVOCATION_INDEX = os.environ.get("REVOCATION_INDEX") # unset = no revocation checks
+REVOCATION_CHECK_SECONDS = float(os.environ.get("REVOCATION_CHECK_SECONDS", 10)) # how often to look for a new index
+KEY_BYTES = 32
+
+_watched = None
+
+def serial_key(serial):
+    return hashlib.sha256(b"serial:%d" % serial).digest()
+
+def _index():
+    global _watched
+    if _watched is None or _watched.path != REVOCATION_INDEX:
+        _watched = sortedindex.Watched(REVOCATION_INDEX, REVOCATION_CHECK_SECONDS)
+    return _watched.get()
+
+def is_revoked(fingerprint, serial):
+    """
+    True if the cert with this SHA-256 fingerprint or serial is revoked. None if there should be an index but there isn't
+    """
+    if not REVOCATION_INDEX:
+        return False
+    index = _index()
+    if index is None:
+        return None
+    return fingerprint in index or serial_key(serial) in index
+
+def parse_list(lines):
+    """
+    Keys for a revoked.txt
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        kind, _, value = line.partition(" ")
+        value = value.strip()
+        try:
+            if kind == "serial":
+                yield serial_key(int(value, 0))
+                continue
+            if kind == "sha256" and len(bytes.fromhex(value.replace(":", ""))) == KEY_BYTES:
+                yield bytes.fromhex(value.replace(":", ""))
+                continue
+        except ValueError:
+            pass
+        raise ValueError(f"line {number}: expected 'serial <number>' or 'sha256 <64 hex digits>'")
+
+def crl_serials(data):
+    import cryptography.x509
+    if b"-----BEGIN" in data:
+        crl = cryptography.x509.load_pem_x509_crl(data)
+    else:
+        crl = cryptography.x509.load_der_x509_crl(data)
+    return [revoked.serial_number for revoked in crl]
+
+def build(path, lists=(), crls=()):
+    """
+    Writes the index from revoked.txt style files and CRL files. Returns how many keys it holds
+    """
+    keys = []
+    for name in lists:
+        with open(name) as f:
+            keys.extend(parse_list(f))
+    for name in crls:
+        with open(name, "rb") as f:
+            keys.extend(serial_key(serial) for serial in crl_serials(f.read()))
+    return sortedindex.build(path, keys, KEY_BYTES, tag=int(time.time()))
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile revoked LoTW certs into the index /verify checks")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build_parser = subcommands.add_parser("build", help="write a new index")
+    build_parser.add_argument("lists", nargs="*", help="files of 'serial <n>' / 'sha256 <hex>' lines")
+    build_parser.add_argument("--crl", action="append", default=[], help="CRL file (PEM or DER), can be repeated")
+    build_parser.add_argument("-o", "--output", required=True, help="index to write, replaced atomically")
+    args = parser.parse_args(argv)
+    if not args.lists and not args.crl:
+        parser.error("nothing to build from")
+
+    started = time.perf_counter()
+    count = build(args.output, args.lists, args.crl)
+    print(f"{count} revoked -> {args.output} in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return count
+
+if __name__ == "__main__":
+    main()
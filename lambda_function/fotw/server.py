@@ -0,0 +1,182 @@
+"""
+Self hosted server for running FoTW without Lambda/API Gateway
+
+    SECRET=... python -m fotw.server --port 8080
+
+Maps the API Gateway routes onto the same handlers:
+    GET  /check/{callsign}/{timestamp}/{code} -> fotw.check.validate
+    POST /check                               -> fotw.check.validate_batch
+    POST /verify                              -> fotw.verify.verify
+
+/check runs on a thread pool so a slow upstream fallback never blocks the event loop. /verify (x509 parsing,
+RSA) runs on a process pool of --verify-workers processes, 0 keeps it on the thread pool.
+"""
+import os
+import sys
+import base64
+import asyncio
+import argparse
+import traceback
+import urllib.parse
+import concurrent.futures
+
+MAX_BODY = int(os.environ.get("SERVER_MAX_BODY", 1024 * 1024))
+KEEPALIVE_TIMEOUT = float(os.environ.get("SERVER_KEEPALIVE_TIMEOUT", 30))
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required", 413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or REASONS.get(status, ""))
+        self.status = status
+
+def _call(handler_path, event):
+    """
+    Runs module:function on event. Top level so it can be sent to a process pool
+    """
+    module, name = handler_path.split(":")
+    handler = getattr(__import__(module, fromlist=[name]), name)
+    return handler(event, None)
+
+def route(method, path):
+    """
+    Returns (handler, pathParameters) for a request, raises HTTPError if nothing matches
+    """
+    parts = [urllib.parse.unquote(part) for part in path.split("?")[0].strip("/").split("/")]
+    if parts[0] == "check" and len(parts) == 4:
+        if method != "GET":
+            raise HTTPError(405)
+        return "fotw.check:validate", {"callsign": parts[1], "timestamp": parts[2], "code": parts[3]}
+    if parts == ["check"]:
+        if method != "POST":
+            raise HTTPError(405)
+        return "fotw.check:validate_batch", None
+    if parts == ["verify"]:
+        if method not in ("POST", "PUT"):
+            raise HTTPError(405)
+        return "fotw.verify:verify", None
+    raise HTTPError(404)
+
+class Server:
+    def __init__(self, verify_workers=os.cpu_count(), check_workers=32):
+        self.check_pool = concurrent.futures.ThreadPoolExecutor(max_workers=check_workers)
+        if verify_workers:
+            self.verify_pool = concurrent.futures.ProcessPoolExecutor(max_workers=verify_workers)
+        else:
+            self.verify_pool = self.check_pool
+        self.requests = 0
+
+    def close(self):
+        self.check_pool.shutdown(wait=False, cancel_futures=True)
+        if self.verify_pool is not self.check_pool:
+            self.verify_pool.shutdown(wait=False, cancel_futures=True)
+
+    async def dispatch(self, method, path, headers, body, peer):
+        handler, path_parameters = route(method, path)
+        event = {
+            "httpMethod": method,
+            "path": path,
+            "pathParameters": path_parameters,
+            "headers": headers,
+            "body": base64.b64encode(body).decode(), # empty is "", the handlers reject that as a 400
+            "isBase64Encoded": True,
+            "requestContext": {"identity": {"sourceIp": peer}}
+        }
+        pool = self.verify_pool if handler == "fotw.verify:verify" else self.check_pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, _call, handler, event)
+        except (ValueError, KeyError) as e:
+            raise HTTPError(400, str(e))
+
+    async def handle(self, reader, writer):
+        peer = (writer.get_extra_info("peername") or ("",))[0]
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split(maxsplit=2)
+                version = version.strip()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                try:
+                    if "chunked" in headers.get("transfer-encoding", "").lower():
+                        raise HTTPError(411)
+                    length = int(headers.get("content-length") or 0)
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise HTTPError(413)
+                    body = await reader.readexactly(length) if length else b""
+                    response = await self.dispatch(method.upper(), path, headers, body, peer)
+                except HTTPError as e:
+                    response = {"statusCode": e.status, "body": str(e), "headers": {"Content-Type": "text/plain"}}
+                except Exception:
+                    traceback.print_exc()
+                    response = {"statusCode": 500, "body": REASONS[500], "headers": {"Content-Type": "text/plain"}}
+                self.requests += 1
+
+                writer.write(self.serialise(response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # client went away or sent garbage
+        finally:
+            writer.close()
+
+    @staticmethod
+    def serialise(response, keep_alive):
+        body = response.get("body") or b""
+        if response.get("isBase64Encoded"):
+            body = base64.b64decode(body)
+        elif isinstance(body, str):
+            body = body.encode()
+        status = response.get("statusCode", 200)
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        for name, value in (response.get("headers") or {}).items():
+            lines.append(f"{name}: {value}")
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+async def serve(host, port, verify_workers, check_workers, ready=None):
+    server = Server(verify_workers=verify_workers, check_workers=check_workers)
+    listener = await asyncio.start_server(server.handle, host, port)
+    if ready is not None:
+        ready(listener, server)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Self hosted FoTW /check and /verify server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--verify-workers", type=int, default=os.cpu_count(), help="processes for /verify, 0 to use threads")
+    parser.add_argument("--check-workers", type=int, default=32, help="threads for /check and its upstream fallback")
+    args = parser.parse_args(argv)
+
+    def ready(listener, server):
+        for sock in listener.sockets:
+            print("listening on %s:%s" % sock.getsockname()[:2], file=sys.stderr)
+    try:
+        asyncio.run(serve(args.host, args.port, args.verify_workers, args.check_workers, ready))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Sorted arrays of fixed width keys in a file, memory mapped and binary searched, so a big set can be looked up
+without reading it all in or parsing anything per container
+
+    sortedindex.build("registry.idx", keys, width=8, tag=log_offset)
+    index = sortedindex.open_index("registry.idx")
+    key in index
+
+The file is a 32 byte header (magic, key width, count, a tag for whoever built it) followed by the keys sorted
+bytewise with duplicates dropped. build() writes a temp file and renames it over the old one so readers never see
+half a file. Watched re-opens the index when that happens, for warm containers. Don't write over an index in
+place, whoever has it mapped would see the new bytes mid-search.
+"""
+import os
+import mmap
+import time
+import bisect
+import struct
+import threading
+
+MAGIC = b"FOTWSIX1"
+HEADER = struct.Struct("<8sIIQQ") # magic, key width, reserved, count, tag
+FENCE_EVERY = 64 # every 64th key is kept in a list so most of the search is bisect in C, not slicing the map
+
+class _Keys:
+    # just enough of a sequence for bisect
+    def __init__(self, buf, width, count):
+        self.buf = buf
+        self.width = width
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = HEADER.size + i * self.width
+        return self.buf[start:start + self.width]
+
+class SortedIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not an index")
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, _, self.count, self.tag = HEADER.unpack_from(self.buf)
+        if magic != MAGIC or not self.width or size != HEADER.size + self.width * self.count:
+            self.buf.close()
+            raise ValueError(f"{path} is not an index")
+        self.keys = _Keys(self.buf, self.width, self.count)
+        self.fence = [self.keys[i] for i in range(0, self.count, FENCE_EVERY)]
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        if len(key) != self.width:
+            return False
+        block = bisect.bisect_right(self.fence, key) - 1
+        if block < 0:
+            return False
+        lo = block * FENCE_EVERY
+        i = bisect.bisect_left(self.keys, key, lo, min(lo + FENCE_EVERY, self.count))
+        return i < self.count and self.keys[i] == key
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.keys[i]
+
+    def close(self):
+        self.buf.close()
+
+class Watched:
+    """
+    The index at path, re-opened when the file is replaced. The file is stat'd at most every check_every seconds.
+    A file that's gone missing or doesn't parse leaves the last good index in place. get() is None until there's been one
+    """
+    def __init__(self, path, check_every=10):
+        self.path = path
+        self.check_every = check_every
+        self.index = None
+        self.identity = None
+        self.checked = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self.checked is None or now - self.checked >= self.check_every:
+            with self.lock:
+                if self.checked is None or now - self.checked >= self.check_every:
+                    self._refresh()
+                    self.checked = now
+        return self.index
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity == self.identity:
+            return
+        try:
+            index = SortedIndex(self.path)
+        except (OSError, ValueError):
+            return
+        # the old mapping is left for the GC, another thread may still be searching it
+        self.index, self.identity = index, identity
+
+def open_index(path):
+    return SortedIndex(path)
+
+def build(path, keys, width, tag=0):
+    """
+    Writes keys (bytes, all width long) as an index at path, replacing whatever was there. Returns how many unique keys it holds
+    """
+    keys = sorted(set(keys))
+    for key in keys:
+        if len(key) != width:
+            raise ValueError(f"Key {key.hex()} is not {width} bytes")
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, width, 0, len(keys), tag))
+        f.write(b"".join(keys))
+    os.replace(temp, path)
+    return len(keys)
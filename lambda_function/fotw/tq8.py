@@ -0,0 +1,72 @@
+"""
+Minimal ADIF reader for TQSL signed logs (.tq8)
+
+Works straight off the decompressed bytes, or an iterable of chunks of them, and yields one record at a time
+so callers can stop as soon as they have what they need - with chunks, nothing past that gets decompressed. Field names are upper cased and <SIGN_LOTW_V2.0:len:6> is read as SIGN_LOTW_V2
+"""
+
+def _field_name(name):
+    name = name.upper()
+    if name.startswith("SIGN_LOTW_V2."):
+        return "SIGN_LOTW_V2"
+    return name
+
+def iter_records(data):
+    """
+    Yields a dict per <eor> terminated record. Anything before <eoh> is treated as header and dropped.
+    data is bytes or an iterable of bytes chunks - only the unparsed tail is kept, plus whatever field is
+    still being read
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        chunks = iter((data,))
+    else:
+        chunks = iter(data)
+    buffer = b""
+    done = False
+    record = {}
+    cursor = 0
+    while True:
+        start = buffer.find(b"<", cursor)
+        close = buffer.find(b">", start) if start != -1 else -1
+        if close == -1:
+            if done:
+                return
+            chunk = next(chunks, None)
+            if chunk is None:
+                done = True
+                continue
+            buffer = buffer[start:] + bytes(chunk) if start != -1 else bytes(chunk)
+            cursor = 0
+            continue
+        tag = buffer[start+1:close].decode(errors="replace")
+        name, sep, spec = tag.partition(":")
+        if not sep:
+            marker = tag.lower()
+            if marker == "eor":
+                yield record
+                record = {}
+            elif marker == "eoh":
+                record = {}
+            cursor = close + 1
+            continue
+
+        length = spec.partition(":")[0]
+        if not length.isdigit():
+            cursor = start + 1 # not a tag, just a stray <
+            continue
+        value_end = close + 1 + int(length)
+        if value_end > len(buffer):
+            if done:
+                raise ValueError("Log truncated")
+            chunk = next(chunks, None)
+            if chunk is None:
+                done = True
+            else:
+                buffer = buffer[start:] + bytes(chunk)
+                cursor = 0
+            continue
+        name = _field_name(name)
+        if name in record:
+            raise ValueError(f"Duplicate {name} in record")
+        record[name] = buffer[close+1:value_end].decode()
+        cursor = value_end
@@ -0,0 +1,162 @@
+"""
+Fallback checks against other FoTW style servers (https://www.9dx.cc by default)
+
+Every upstream is asked at the same time, each with its own timeout. If HEDGE_AFTER is set and an
+upstream hasn't answered by then a second request is sent to it and whichever answers first wins.
+Connections are kept per thread and reused across warm invocations. Upstreams whose circuit breaker
+(fotw.breaker) is open are skipped, and the caller can pass a deadline to cut the whole thing short.
+"""
+import os
+import time
+import threading
+import http.client
+import urllib.parse
+import concurrent.futures
+from fotw import codes, breaker
+
+UPSTREAMS = [upstream.strip().rstrip("/") for upstream in os.environ.get("UPSTREAMS", "https://www.9dx.cc").split(",") if upstream.strip()]
+TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", 2.0)) # seconds, per upstream request
+HEDGE_AFTER = float(os.environ.get("UPSTREAM_HEDGE_AFTER", 0)) # seconds, 0 disables hedging
+
+_pool = concurrent.futures.ThreadPoolExecutor(max_workers=int(os.environ.get("UPSTREAM_WORKERS", 16)))
+_local = threading.local()
+
+class UpstreamError(Exception):
+    pass
+
+Unavailable = breaker.Unavailable
+
+def _connection(upstream):
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(upstream)
+    if connection is None:
+        url = urllib.parse.urlsplit(upstream)
+        if url.scheme == "https":
+            connection = http.client.HTTPSConnection(url.netloc, timeout=TIMEOUT)
+        else:
+            connection = http.client.HTTPConnection(url.netloc, timeout=TIMEOUT)
+        connections[upstream] = connection
+    return connection
+
+def _drop(upstream):
+    connection = _local.connections.pop(upstream, None)
+    if connection is not None:
+        connection.close()
+
+def fetch(upstream, path):
+    """
+    GET path from a single upstream, reusing this thread's connection if there is one
+    """
+    prefix = urllib.parse.urlsplit(upstream).path
+    for attempt in range(2):
+        connection = _connection(upstream)
+        reused = connection.sock is not None
+        try:
+            connection.request("GET", prefix + path)
+            response = connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            _drop(upstream)
+            if reused and attempt == 0:
+                continue # server probably closed the idle connection on us
+            raise
+        if response.will_close:
+            _drop(upstream)
+        if response.status != 200:
+            raise UpstreamError(f"{upstream} returned {response.status}")
+        return body.decode(errors="replace")
+
+def _fetch(upstream, path, call):
+    ok = False
+    try:
+        body = fetch(upstream, path)
+        ok = True
+        return body
+    finally:
+        call.done(ok)
+
+def ask(callsign, timestamp, code, deadline=None):
+    """
+    Asks every upstream whose breaker lets it about callsign/timestamp/code. Returns the first VERIFIED answer,
+    otherwise the first successful answer once every upstream has answered or failed. Gives up at deadline (time.monotonic()) if that's sooner than TIMEOUT.
+    Raises Unavailable if there's no answer at all
+    """
+    path = codes.check_path(callsign, timestamp, code)
+    started = time.monotonic()
+    deadline = started + TIMEOUT if deadline is None else min(deadline, started + TIMEOUT)
+    if deadline <= started:
+        raise Unavailable("Out of time")
+    pending = {}
+    def send(upstream):
+        call = breaker.get(upstream).call()
+        if call is not None:
+            pending[_pool.submit(_fetch, upstream, path, call)] = (upstream, call)
+    for upstream in UPSTREAMS:
+        send(upstream)
+    if not pending:
+        raise Unavailable("Circuit open")
+    hedged = False
+    answer = None
+
+    def drop(upstream):
+        # another copy to upstream answered, the rest are neither wanted nor the upstream's fault
+        for future, (other, call) in list(pending.items()):
+            if other == upstream:
+                del pending[future]
+                future.cancel()
+                call.discard()
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        wait = deadline - now
+        if HEDGE_AFTER and not hedged:
+            wait = max(0, min(wait, started + HEDGE_AFTER - now))
+        done, _ = concurrent.futures.wait(pending, timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+
+        for future in done:
+            if future not in pending:
+                continue # dropped when a copy before it in done answered
+            upstream, _ = pending.pop(future)
+            try:
+                body = future.result()
+            except (OSError, http.client.HTTPException, UpstreamError):
+                continue
+            drop(upstream)
+            if codes.is_verified(body):
+                return body
+            if answer is None:
+                answer = body
+
+        if HEDGE_AFTER and not hedged and time.monotonic() - started >= HEDGE_AFTER:
+            hedged = True # only ever hedge once
+            for upstream in {upstream for upstream, _ in pending.values()}:
+                send(upstream)
+
+    failed = set()
+    for future, (upstream, call) in pending.items():
+        # still queued or going at the deadline - drop it if it hasn't started so it doesn't hold up the pool
+        # (a cancelled _fetch never reports back). One failure per upstream that never answered, however many
+        # copies it had out
+        future.cancel()
+        if upstream in failed:
+            call.discard()
+        else:
+            failed.add(upstream)
+            call.done(False)
+
+    if answer is None:
+        raise Unavailable("No answer")
+    return answer
+
+def check(callsign, timestamp, code, deadline=None):
+    """
+    ask(), but "<callsign> UNVERIFIED" when there's no answer
+    """
+    try:
+        return ask(callsign, timestamp, code, deadline)
+    except Unavailable:
+        return f"{callsign} UNVERIFIED"
@@ -0,0 +1,295 @@
+"""
+/verify - checks a TQSL signed log and hands out the callsign's secret
+"""
+import os
+import base64
+import zlib
+import hashlib
+import json
+import datetime
+import threading
+import functools
+import collections
+from fotw import tq8, metrics, registry, revocation
+
+VERIFICATION_SIGDATA = "ZZ9FOTWFT8" # This is callsign ZZ9FOTW, mode FT8 
+
+CA_PATH = os.environ.get("CA_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ca.pem"))
+CERT_CACHE_SIZE = int(os.environ.get("CERT_CACHE_SIZE", 256)) # chain checked user certs kept per container
+VERIFY_MEMO_SIZE = int(os.environ.get("VERIFY_MEMO_SIZE", 0)) # whole /verify bodies remembered by hash, 0 disables
+VERIFY_MAX_GROUPS = int(os.environ.get("VERIFY_MAX_GROUPS", 16)) # tCERT/tSTATION/tCONTACT groups allowed in one log
+VERIFY_MAX_BODY = int(os.environ.get("VERIFY_MAX_BODY", 256 * 1024)) # bytes of base64 request body
+VERIFY_MAX_DECOMPRESSED = int(os.environ.get("VERIFY_MAX_DECOMPRESSED", 1024 * 1024)) # bytes of log, a cert group is ~5 kB
+DECOMPRESS_CHUNK = 16 * 1024
+VERIFY_WORKERS = int(os.environ.get("VERIFY_WORKERS", 8)) # threads for chain + RSA checks of multi cert logs
+
+DAYS_VALID = 60 # this should be lower but I forgot javascript was 0 indexed for months. Once static content cache has been invalidated will change back
+
+@functools.cache
+def ca():
+    import cryptography.x509
+    with open(CA_PATH, "rb") as f:
+        return cryptography.x509.load_pem_x509_certificate(f.read())
+
+CertInfo = collections.namedtuple("CertInfo", ["callsign", "serial", "fingerprint", "not_before", "not_after", "public_key"])
+
+_cert_cache = collections.OrderedDict()
+_verify_memo = collections.OrderedDict()
+_cache_lock = threading.Lock() # multi cert logs load certs from several threads
+
+def _remember(cache, key, value, size):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+def load_user_cert(certificate, metric=metrics.NULL):
+    """
+    Loads a base64 DER user cert and checks it was issued by ca. Cached by SHA-256 of the DER, dates are left to the caller
+    """
+    der = base64.b64decode(certificate)
+    fingerprint = hashlib.sha256(der).digest()
+    with _cache_lock:
+        info = _cert_cache.get(fingerprint)
+        if info is not None:
+            _cert_cache.move_to_end(fingerprint)
+    if info is not None:
+        metric.set(cert_cache="hit")
+        return info
+    metric.set(cert_cache="miss")
+
+    with metric.stage("x509_load"):
+        import cryptography.x509
+        from cryptography.exceptions import InvalidSignature
+        user = cryptography.x509.load_der_x509_certificate(der)
+    with metric.stage("chain"):
+        try:
+            user.verify_directly_issued_by(ca())
+        except (InvalidSignature, ValueError): # ValueError when the issuer name doesn't even match
+            raise ValueError("Cert not issued by LoTW")
+    info = CertInfo(
+        user.subject.get_attributes_for_oid(cryptography.x509.ObjectIdentifier("1.3.6.1.4.1.12348.1.1"))[0].value,
+        user.serial_number,
+        fingerprint,
+        user.not_valid_before_utc,
+        user.not_valid_after_utc,
+        user.public_key()
+    )
+    _remember(_cert_cache, fingerprint, info, CERT_CACHE_SIZE)
+    return info
+
+def _secret(callsign):
+    from fotw.keys import user_key # so the offline tools don't need SECRET
+    return user_key(callsign).secret_b32.decode()
+
+def _verify_response(groups):
+    """
+    groups is a (callsign, None) or (None, error) per group in log order. First verified callsign + secret at the top
+    level like it's always been, every group under results, in log order with its index, if there's more than one
+    """
+    first = next(callsign for callsign, error in groups if error is None)
+    body = {
+        "callsign": first,
+        "secret": _secret(first)
+    }
+    if len(groups) > 1:
+        body["results"] = [
+            {"group": i, "callsign": callsign, "secret": _secret(callsign)} if error is None else {"group": i, "error": error}
+            for i, (callsign, error) in enumerate(groups)
+        ]
+    return {
+        "body": json.dumps(body),
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json"
+        }
+    }
+
+def gunzip(data, limit=None):
+    """
+    Yields the decompressed log DECOMPRESS_CHUNK bytes at a time, so a gzip bomb only ever gets as far as limit
+    (default VERIFY_MAX_DECOMPRESSED) and stopping early skips the rest. Only the first gzip member is read
+    """
+    limit = VERIFY_MAX_DECOMPRESSED if limit is None else limit
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    pending = data
+    total = 0
+    while not decompressor.eof:
+        if not pending:
+            raise ValueError("Log not gzipped") # ran out before the end of the stream
+        try:
+            chunk = decompressor.decompress(pending, DECOMPRESS_CHUNK)
+        except zlib.error:
+            raise ValueError("Log not gzipped")
+        pending = decompressor.unconsumed_tail
+        total += len(chunk)
+        if total > limit:
+            raise ValueError("Log too large")
+        if chunk:
+            yield chunk
+
+def _unique(records, field):
+    by_uid = {}
+    for record in records:
+        uid = record.get(field)
+        if uid is None:
+            raise ValueError(f"Missing {field}")
+        if uid in by_uid:
+            raise ValueError(f"Duplicate {field}")
+        by_uid[uid] = record
+    return by_uid
+
+def parse_groups(data, metric=metrics.NULL):
+    """
+    Splits a log into (base64 cert, tCONTACT) pairs. Every cert, station and contact has to belong to exactly one group
+    """
+    records = []
+    with metric.stage("parse"):
+        for record in tq8.iter_records(data):
+            records.append(record)
+            if len(records) > VERIFY_MAX_GROUPS * 3:
+                break # no point reading the rest
+    if len(records) > VERIFY_MAX_GROUPS * 3 or len(records) % 3:
+        raise ValueError("Log contains too many records")
+    by_type = {"tCERT": [], "tSTATION": [], "tCONTACT": []}
+    for record in records:
+        if record.get('REC_TYPE') not in by_type:
+            raise ValueError("Unexpected record type")
+        by_type[record['REC_TYPE']].append(record)
+    if not by_type["tCERT"]:
+        raise ValueError("Did not find tCERT")
+    if not by_type["tCONTACT"]:
+        raise ValueError("Did not find tCONTACT")
+    if not len(by_type["tCERT"]) == len(by_type["tSTATION"]) == len(by_type["tCONTACT"]):
+        raise ValueError("Log contains too many records")
+
+    certs = _unique(by_type["tCERT"], 'CERT_UID')
+    stations = _unique(by_type["tSTATION"], 'STATION_UID')
+    _unique(by_type["tCONTACT"], 'STATION_UID') # one contact per station
+    if len({station.get('CERT_UID') for station in stations.values()}) != len(stations):
+        raise ValueError("Duplicate CERT_UID")
+
+    groups = []
+    for qso in by_type["tCONTACT"]:
+        station = stations.get(qso['STATION_UID'])
+        if station is None or station.get('CERT_UID') not in certs:
+            raise ValueError("tCONTACT without tSTATION/tCERT")
+        groups.append((certs[station['CERT_UID']]['CERTIFICATE'], qso))
+    return groups
+
+def _check_revoked(users, metric=metrics.NULL):
+    for user in users:
+        revoked = revocation.is_revoked(user.fingerprint, user.serial)
+        if revoked:
+            raise ValueError("Cert revoked")
+        if revoked is None:
+            # configured but never loaded - can't tell a revoked cert from a good one, so nothing gets through
+            metric.set(revocation="unavailable")
+            raise ValueError("Revocation list unavailable")
+
+def check_group(cert, qso, now, metric=metrics.NULL):
+    """
+    Runs the /verify checks on one cert + contact. Returns (CertInfo, qso datetime) or raises ValueError
+    """
+    # parsing and checking dates serves two purposes
+    # making sure the signed log is recent and ensuring tampering of qso date/time isn't messing with SIGDATA
+    qso_date = datetime.datetime.fromisoformat(qso['QSO_DATE']+"T"+qso['QSO_TIME'])
+
+    if ( (qso_date < (now - datetime.timedelta(days=DAYS_VALID))) or
+         (qso_date > (now + datetime.timedelta(days=DAYS_VALID)))
+        ):
+        raise ValueError("Log QSO dates too far out of range")
+
+    if not qso['SIGNDATA'].endswith(VERIFICATION_SIGDATA+qso['QSO_DATE']+qso['QSO_TIME']):
+        raise ValueError("Not matching sig")
+
+    user = load_user_cert(cert, metric)
+
+    # re-checked every time as the cert itself may be cached
+    if now > user.not_after or now < user.not_before:
+        raise ValueError("Cert time not valid")
+    _check_revoked([user], metric)
+
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from cryptography.exceptions import InvalidSignature
+    sig = qso['SIGN_LOTW_V2']
+
+    with metric.stage("signature"):
+        try:
+            user.public_key.verify(base64.b64decode(sig), qso['SIGNDATA'].encode(), padding.PKCS1v15(), hashes.SHA1())
+        except InvalidSignature:
+            raise ValueError("Signature not valid")
+    return user, qso_date
+
+@functools.cache
+def _pool():
+    import concurrent.futures
+    return concurrent.futures.ThreadPoolExecutor(max_workers=VERIFY_WORKERS)
+
+def check_log(data, now=None, metric=metrics.NULL):
+    """
+    Runs every /verify check on an uncompressed TQ8 log (bytes or chunks from gunzip), as of now. Returns a (CertInfo, qso datetime, None) or
+    (None, None, ValueError) per group, in log order. Problems with the log as a whole are raised
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    groups = parse_groups(data, metric)
+
+    def check(group):
+        try:
+            return check_group(*group, now, metric if len(groups) == 1 else metrics.NULL) + (None,)
+        except ValueError as e:
+            return None, None, e
+
+    if len(groups) == 1:
+        return [check(groups[0])]
+    # the per group stages would overlap across the pool, so multi cert logs only time the lot
+    with metric.stage("groups"):
+        return list(_pool().map(check, groups))
+
+@metrics.instrumented("verify")
+def verify(event, context, metric):
+    """
+    Checks a log file to see if its correctly sign by a LoTW valid cert
+    """
+    body = event['body']
+    if len(body) > VERIFY_MAX_BODY:
+        raise ValueError("Log too large")
+
+    memo_key = None
+    if VERIFY_MEMO_SIZE:
+        memo_key = hashlib.sha256(body.encode() if isinstance(body, str) else body).digest()
+        memo = _verify_memo.get(memo_key)
+        if memo is not None:
+            users, valid_from, valid_until = memo
+            try:
+                if not valid_from <= datetime.datetime.now(datetime.timezone.utc) <= valid_until:
+                    raise ValueError("Cert time not valid")
+                _check_revoked(users, metric)
+            except ValueError: # run the full checks so the right error comes back
+                _verify_memo.pop(memo_key, None)
+            else:
+                metric.result("memo")
+                return _verify_response([(user.callsign, None) for user in users])
+
+    with metric.stage("decode"):
+        data = gunzip(base64.b64decode(body)) # decompressed as it's parsed
+
+    results = check_log(data, metric=metric)
+    verified = [(user, qso_date) for user, qso_date, error in results if error is None]
+    errors = [error for _, _, error in results if error is not None]
+    metric.set(groups=len(results))
+    if not verified:
+        raise errors[0]
+
+    if memo_key is not None and not errors:
+        valid_from = max(max(user.not_before, qso_date - datetime.timedelta(days=DAYS_VALID)) for user, qso_date in verified)
+        valid_until = min(min(user.not_after, qso_date + datetime.timedelta(days=DAYS_VALID)) for user, qso_date in verified)
+        _remember(_verify_memo, memo_key, ([user for user, _ in verified], valid_from, valid_until), VERIFY_MEMO_SIZE)
+
+    if not registry.record([(user.callsign, user.serial) for user, _ in verified]):
+        metric.set(issuance_log="error") # their codes still verify, /check just can't take the short cut yet
+
+    with metric.stage("derive"):
+        return _verify_response([(None, str(error)) if error is not None else (user.callsign, None) for user, _, error in results])
@@ -0,0 +1,163 @@
+"""
+Replays recorded API Gateway events at the handlers to see how they hold up under a contest weekend sort of load
+
+    python replay.py events.jsonl --concurrency 32 --rate 500 --duration 60 \
+        --upstream-latency 0.08 --upstream-error-rate 0.02 --upstream-verified-ratio 0.4
+
+events.jsonl has one Lambda event per line as API Gateway hands it over (httpMethod, path, pathParameters, body..).
+The handler is picked the same way fotw.server routes requests. Everything runs in this process and the 9dx.cc
+fallback goes to a local upstream_standin, so nothing touches the real upstream.
+
+With --rate, events are sent on a fixed schedule and latency is measured from when each one was due, so a
+backlog shows up in the percentiles instead of quietly slowing the sender down.
+"""
+import os
+import json
+import time
+import argparse
+import itertools
+import threading
+import collections
+import concurrent.futures
+
+from benchmarks import percentiles
+
+UNROUTED = "unrouted" # handler name in the results for events that never reach one
+
+def load_events(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def handler_for(event):
+    """
+    Returns "module:function" for a recorded event, raises server.HTTPError if the server wouldn't route it
+    """
+    from fotw import server
+    if event.get("httpMethod") and event.get("path"):
+        return server.route(event["httpMethod"].upper(), event["path"])[0]
+    # older recordings without the request line
+    if event.get("pathParameters"):
+        return "fotw.check:validate"
+    body = event.get("body") or ""
+    return "fotw.check:validate_batch" if body.lstrip().startswith("[") else "fotw.verify:verify"
+
+def outcome(handler, response=None, error=None):
+    """
+    Short label for the error breakdown
+    """
+    if error is not None:
+        return f"{type(error).__name__}: {error}"
+    status = response.get("statusCode", 200)
+    if handler == "fotw.check:validate" and status == 200:
+        return "200 VERIFIED" if response["body"].strip().endswith(" VERIFIED") else "200 UNVERIFIED"
+    return str(status)
+
+def replay(events, concurrency=8, rate=0, count=None, duration=None):
+    """
+    Sends events (cycling through them if count or duration asks for more) and returns a list of
+    (handler, latency ms, outcome)
+    """
+    from fotw import server
+    results = []
+    lock = threading.Lock()
+    sem = threading.Semaphore(concurrency * 2) # bounds the queue when the handlers can't keep up
+
+    def fire(handler, event, due):
+        try:
+            response = server._call(handler, event)
+            label = outcome(handler, response)
+        except Exception as e:
+            label = outcome(handler, error=e)
+        elapsed = (time.perf_counter() - due) * 1000
+        with lock:
+            results.append((handler, elapsed, label))
+        sem.release()
+
+    source = itertools.cycle(events) if count or duration else iter(events)
+    if count:
+        source = itertools.islice(source, count)
+    routed = {}
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i, event in enumerate(source):
+            if duration and time.perf_counter() - started >= duration:
+                break
+            key = id(event)
+            if key not in routed:
+                try:
+                    routed[key] = handler_for(event)
+                except server.HTTPError as e:
+                    routed[key] = e
+            if isinstance(routed[key], server.HTTPError):
+                # e.g. an OPTIONS preflight or a stage prefixed path, the server would answer it without a handler
+                with lock:
+                    results.append((UNROUTED, 0.0, str(routed[key].status)))
+                continue
+            if rate:
+                due = started + i / rate
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                sem.acquire()
+            else:
+                sem.acquire()
+                due = time.perf_counter()
+            executor.submit(fire, routed[key], event, due)
+    return results, time.perf_counter() - started
+
+def summarise(results, elapsed):
+    summary = {"requests": len(results), "seconds": round(elapsed, 3), "per_sec": round(len(results) / elapsed, 1) if elapsed else None, "handlers": {}}
+    by_handler = collections.defaultdict(list)
+    for handler, latency, label in results:
+        by_handler[handler].append((latency, label))
+    for handler, rows in sorted(by_handler.items()):
+        latencies = [latency for latency, _ in rows]
+        summary["handlers"][handler] = {
+            "requests": len(rows),
+            **{f"{name}_ms": round(value, 3) for name, value in percentiles(latencies).items()},
+            "max_ms": round(max(latencies), 3),
+            "outcomes": dict(collections.Counter(label for _, label in rows).most_common())
+        }
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded API Gateway events at the FoTW handlers")
+    parser.add_argument("events", help="JSONL of recorded events")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="handler calls in flight")
+    parser.add_argument("--rate", type=float, default=0, help="events per second, 0 = as fast as they finish")
+    parser.add_argument("-n", "--count", type=int, help="send this many events, looping over the file")
+    parser.add_argument("--duration", type=float, help="keep looping over the file for this many seconds")
+    parser.add_argument("-o", "--output", help="write the summary as JSON")
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="stand-in 9dx.cc latency in seconds")
+    parser.add_argument("--upstream-error-rate", type=float, default=0, help="fraction of stand-in answers that are a 500")
+    parser.add_argument("--upstream-verified-ratio", type=float, default=0, help="fraction of stand-in answers that are VERIFIED")
+    parser.add_argument("--result-cache", default="memory", help="RESULT_CACHE setting for the run")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("SECRET", "replay-secret")
+    import upstream_standin
+    from fotw import upstream, result_cache
+    standin = upstream_standin.StandIn(delay=args.upstream_latency, error_rate=args.upstream_error_rate, verified_ratio=args.upstream_verified_ratio)
+    upstream.UPSTREAMS = [standin.url]
+    result_cache.backend = result_cache.backend_from_config(args.result_cache)
+
+    try:
+        results, elapsed = replay(load_events(args.events), args.concurrency, args.rate, args.count, args.duration)
+    finally:
+        standin.stop()
+    summary = summarise(results, elapsed)
+    summary["upstream_requests"] = standin.requests
+
+    print(f"{summary['requests']} requests in {summary['seconds']}s - {summary['per_sec']}/s, {standin.requests} went upstream")
+    print(f"{'handler':28} {'requests':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for handler, stats in summary["handlers"].items():
+        print(f"{handler:28} {stats['requests']:9} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} {stats['max_ms']:9.2f}")
+        for label, count in stats["outcomes"].items():
+            print(f"    {count:8}  {label}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import unittest
+import os
+import io
+import json
+import tempfile
+import contextlib
+from unittest import mock
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+import benchmarks
+from fotw import verify, upstream, result_cache
+
+class TestBenchmarks(unittest.TestCase):
+    def test_percentiles(self):
+        self.assertEqual(benchmarks.percentiles(range(1, 101)), {"p50": 51, "p95": 96, "p99": 100})
+
+    def test_smoke(self):
+        # every case has to at least run, otherwise the suite rots
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            # the cases point these at the stand-ins, put them back afterwards
+            with contextlib.redirect_stdout(io.StringIO()), \
+                    mock.patch.object(verify, "ca", verify.ca), \
+                    mock.patch.object(verify, "VERIFICATION_SIGDATA", verify.VERIFICATION_SIGDATA), \
+                    mock.patch.object(upstream, "UPSTREAMS", upstream.UPSTREAMS), \
+                    mock.patch.object(result_cache, "backend", result_cache.backend):
+                benchmarks.main(["--duration", "0", "--upstream-latency", "0", "--revocation-entries", "1000", "-o", output])
+                benchmarks.main(["--duration", "0", "--upstream-latency", "0", "-k", "validate_local_hit", "--compare", output])
+            with open(output) as f:
+                results = json.load(f)["results"]
+        self.assertEqual(set(results), set(benchmarks.CASES))
+        for result in results.values():
+            self.assertGreater(result["ops_per_sec"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
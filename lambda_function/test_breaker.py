@@ -0,0 +1,164 @@
+import unittest
+from unittest import mock
+import os
+import json
+import time
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+from fotw import breaker, metrics, check, upstream, result_cache, ratelimit
+from upstream_standin import StandIn
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = breaker.Breaker("up", failure_rate=0.5, min_calls=4, window=10, slow_seconds=1, open_seconds=5, clock=self.clock)
+        self.lines = []
+        for patch in (mock.patch.object(metrics, "ENABLED", True), mock.patch.object(metrics, "emit", self.lines.append)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def calls(self, *outcomes):
+        for ok in outcomes:
+            self.breaker.call().done(ok)
+
+    def test_opens_on_failure_rate(self):
+        self.calls(True, False, True)
+        self.assertEqual(self.breaker.state, breaker.CLOSED) # not enough calls yet
+        self.calls(False)
+        self.assertEqual(self.breaker.state, breaker.OPEN)
+        self.assertIsNone(self.breaker.call())
+        self.assertEqual([(line["Upstream"], line["State"], line["breaker_transitions"]) for line in self.lines], [("up", "open", 1)])
+        self.assertEqual(self.lines[0]["_aws"]["CloudWatchMetrics"][0]["Dimensions"], [["Upstream", "State"]])
+
+    def test_window(self):
+        self.calls(False, False, True)
+        self.clock.now += 11 # those two failures have aged out
+        self.calls(True, True, True, False)
+        self.assertEqual(self.breaker.state, breaker.CLOSED)
+
+    def test_slow_calls_fail(self):
+        for _ in range(4):
+            call = self.breaker.call()
+            self.clock.now += 1.5
+            call.done(True)
+        self.assertEqual(self.breaker.state, breaker.OPEN)
+
+    def test_half_open(self):
+        self.calls(False, False, False, False)
+        self.clock.now += 4.9
+        self.assertIsNone(self.breaker.call())
+        self.clock.now += 0.2
+        probe = self.breaker.call()
+        self.assertTrue(probe.probe)
+        self.assertEqual(self.breaker.state, breaker.HALF_OPEN)
+        self.assertIsNone(self.breaker.call()) # one probe at a time
+        probe.done(False)
+        self.assertEqual(self.breaker.state, breaker.OPEN)
+        self.assertIsNone(self.breaker.call())
+
+        self.clock.now += 5
+        self.breaker.call().done(True)
+        self.assertEqual(self.breaker.state, breaker.CLOSED)
+        self.assertIsNotNone(self.breaker.call())
+        self.assertEqual([line["State"] for line in self.lines], ["open", "half_open", "open", "half_open", "closed"])
+
+    def test_done_counts_once(self):
+        call = self.breaker.call()
+        call.done(False)
+        call.done(True)
+        self.assertEqual((len(self.breaker.calls), self.breaker.failures), (1, 1))
+        # answers to calls sent before it opened don't count
+        late = self.breaker.call()
+        self.calls(False, False, False)
+        late.done(True)
+        self.assertEqual(self.breaker.state, breaker.OPEN)
+        self.assertEqual(len(self.breaker.calls), 0)
+
+    def test_disabled(self):
+        self.breaker.failure_rate = 0
+        self.calls(*[False] * 10)
+        self.assertEqual(self.breaker.state, breaker.CLOSED)
+
+class TestFallbackFaults(unittest.TestCase):
+    """
+    /check against a stand-in 9dx.cc that fails or stalls on demand
+    """
+    def setUp(self):
+        self.standin = StandIn(verified_ratio=1)
+        self.addCleanup(self.standin.stop)
+        for patch in (
+            mock.patch.object(upstream, "UPSTREAMS", [self.standin.url]),
+            mock.patch.object(upstream, "TIMEOUT", 0.3),
+            mock.patch.object(breaker, "MIN_CALLS", 3),
+            mock.patch.object(breaker, "OPEN_SECONDS", 0.3),
+            mock.patch.object(breaker, "SLOW_SECONDS", 0.2),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+        ratelimit.reset()
+        result_cache.backend = result_cache.MemoryBackend()
+
+    def validate(self, code):
+        started = time.monotonic()
+        output = check.validate({"pathParameters": {"callsign": "VK3FUR", "timestamp": "2024-09-05T19:07:00Z", "code": f"{code:06d}"}}, None)
+        return output, time.monotonic() - started
+
+    def test_errors_open_then_recover(self):
+        self.standin.error_rate = 1
+        for i in range(3):
+            output, _ = self.validate(i)
+            self.assertEqual(output["body"], "VK3FUR UNVERIFIED")
+            self.assertEqual(output["headers"]["Cache-Control"], "no-store")
+        self.assertEqual(breaker.states(), {self.standin.url: breaker.OPEN})
+
+        # open: nothing goes out, answers come straight back
+        requests = self.standin.requests
+        for i in range(3, 10):
+            output, elapsed = self.validate(i)
+            self.assertEqual(output["body"], "VK3FUR UNVERIFIED")
+            self.assertLess(elapsed, 0.1)
+        self.assertEqual(self.standin.requests, requests)
+
+        # the outage answers weren't cached, so once the probe gets through the real answer does
+        self.standin.error_rate = 0
+        time.sleep(0.35)
+        output, _ = self.validate(0)
+        self.assertEqual(output["body"], "VK3FUR VERIFIED")
+        self.assertEqual(breaker.states(), {self.standin.url: breaker.CLOSED})
+        self.assertEqual(self.standin.requests, requests + 1)
+
+    def test_slow_upstream_opens(self):
+        self.standin.delay = 1
+        for i in range(3):
+            _, elapsed = self.validate(i)
+            self.assertLess(elapsed, 0.6) # upstream timeout, not the stand-in's delay
+        self.assertEqual(breaker.states(), {self.standin.url: breaker.OPEN})
+        _, elapsed = self.validate(99)
+        self.assertLess(elapsed, 0.1)
+
+    def test_batch_budget(self):
+        self.standin.delay = 0.25
+        checks = [{"callsign": f"VK3A{i}", "timestamp": "2024-09-05T19:07:00Z", "code": "000000"} for i in range(8)]
+        with mock.patch.object(check, "UPSTREAM_BUDGET", 0.4), mock.patch.object(check, "BATCH_FALLBACK_WORKERS", 2), \
+                mock.patch.object(breaker, "SLOW_SECONDS", 1), mock.patch.object(upstream, "TIMEOUT", 1):
+            breaker.reset()
+            started = time.monotonic()
+            results = json.loads(check.validate_batch({"body": json.dumps(checks)}, None)["body"])
+            elapsed = time.monotonic() - started
+        self.assertLess(elapsed, 0.7) # 4 rounds of 0.25 s without the budget
+        statuses = [(result["status"], result.get("error")) for result in results]
+        self.assertIn(("VERIFIED", None), statuses)
+        self.assertIn(("UNVERIFIED", "Upstream unavailable"), statuses)
+        self.assertIsNone(result_cache.backend.get("VK3A7/2024-09-05T19:07:00Z/000000"))
+
+if __name__ == '__main__':
+    unittest.main()
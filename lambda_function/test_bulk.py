@@ -0,0 +1,34 @@
+import unittest
+from unittest import mock
+import os
+import random
+import base64
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+import pyotp
+from fotw import bulk, keys
+
+class TestBulk(unittest.TestCase):
+    def test_matches_pyotp(self):
+        rng = random.Random(1)
+        callsigns = ["VK3FUR", "VK3ABC", "N0CALL", "9A/VK3FUR/P"] + [f"W{rng.randrange(10**5)}" for _ in range(60)]
+        counters = [0, 1, 57518573, 2**32 + 7, 2**40] + [rng.randrange(2**34) for _ in range(20)]
+        codes = bulk.format_tokens(bulk.tokens(callsigns, counters))
+        for i, callsign in enumerate(callsigns):
+            hotp = pyotp.HOTP(keys.UserKey(callsign).secret_b32)
+            for j, counter in enumerate(counters):
+                self.assertEqual(codes[i][j], hotp.at(counter), (callsign, counter))
+
+    def test_other_secret_lengths(self):
+        secrets = [b"x", b"12345678901234567890", bytes(range(64))]
+        counters = [3, 99, 2**63]
+        codes = bulk.hotp(secrets, counters, digits=8)
+        for i, secret in enumerate(secrets):
+            hotp = pyotp.HOTP(base64.b32encode(secret).decode(), digits=8)
+            for j, counter in enumerate(counters):
+                self.assertEqual(f"{codes[i][j]:08d}", hotp.at(counter))
+        with self.assertRaises(ValueError):
+            bulk.hotp([bytes(65)], [1])
+
+if __name__ == '__main__':
+    unittest.main()
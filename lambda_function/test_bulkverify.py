@@ -0,0 +1,92 @@
+import unittest
+from unittest import mock
+import os
+import io
+import gzip
+import json
+import tarfile
+import datetime
+import tempfile
+import contextlib
+from cryptography.hazmat.primitives import serialization
+
+import tq8_fixtures
+from fotw import verify, bulkverify
+
+class TestBulkVerify(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.ca = tq8_fixtures.TestCA()
+        cls.user = cls.ca.issue("VK3FUR", serial=1234)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.ca_path = os.path.join(cls.tmp.name, "ca.pem")
+        with open(cls.ca_path, "wb") as f:
+            f.write(cls.ca.cert.public_bytes(serialization.Encoding.PEM))
+
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        cls.logs = {
+            "good.tq8": gzip.compress(tq8_fixtures.make_tq8([(cls.user, now)]).encode()),
+            "plain.tq8": tq8_fixtures.make_tq8([(cls.user, now)]).encode(),
+            "sub/old.tq8": gzip.compress(tq8_fixtures.make_tq8([(cls.user, now - datetime.timedelta(days=200))]).encode()),
+            "sub/other_ca.tq8": gzip.compress(tq8_fixtures.make_tq8([(tq8_fixtures.TestCA().issue("VK3ABC"), now)]).encode()),
+        }
+        cls.dir = os.path.join(cls.tmp.name, "logs")
+        for name, data in cls.logs.items():
+            os.makedirs(os.path.dirname(os.path.join(cls.dir, name)), exist_ok=True)
+            with open(os.path.join(cls.dir, name), "wb") as f:
+                f.write(data)
+        with open(os.path.join(cls.dir, "notes.txt"), "w") as f:
+            f.write("not a log")
+
+        cls.tar = os.path.join(cls.tmp.name, "logs.tar.gz")
+        with tarfile.open(cls.tar, "w:gz") as tar:
+            for name, data in cls.logs.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        for patch in (mock.patch.object(verify, "CA_PATH"), mock.patch.object(verify, "VERIFICATION_SIGDATA", "ZZ9FOTWFT8")):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(verify.ca.cache_clear)
+        self.addCleanup(verify._cert_cache.clear)
+
+    def run_main(self, *args):
+        out = os.path.join(self.tmp.name, "out.jsonl")
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            bulkverify.main([*args, "--ca", self.ca_path, "-o", out])
+        with open(out) as f:
+            return {result["file"]: result for result in map(json.loads, f)}, stderr.getvalue()
+
+    def check(self, results):
+        self.assertEqual(set(results), set(self.logs))
+        for name in ("good.tq8", "plain.tq8"):
+            self.assertEqual(results[name]["outcome"], "ok")
+            self.assertEqual(results[name]["callsign"], "VK3FUR")
+            self.assertEqual(results[name]["serial"], 1234)
+        self.assertEqual(results["sub/old.tq8"]["reason"], "Log QSO dates too far out of range")
+        self.assertEqual(results["sub/other_ca.tq8"]["reason"], "Cert not issued by LoTW")
+        self.assertEqual(results["sub/other_ca.tq8"]["outcome"], "rejected")
+
+    def test_directory_inline(self):
+        results, stderr = self.run_main(self.dir, "-w", "0")
+        self.check(results)
+        self.assertIn("4 logs", stderr)
+
+    def test_tar_process_pool(self):
+        results, _ = self.run_main(self.tar, "-w", "2")
+        self.check(results)
+
+    def test_at(self):
+        at = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=200)).isoformat()
+        results, _ = self.run_main(self.dir, "-w", "0", "--at", at)
+        self.assertEqual(results["sub/old.tq8"]["outcome"], "ok")
+        self.assertEqual(results["good.tq8"]["reason"], "Log QSO dates too far out of range")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+import os
+import time
+import base64
+import asyncio
+
+import pyotp
+import upstream_standin
+from fotw import codes
+from fotw.client import Client, ClientError
+
+SECRET = "1234567890"
+TIMESTAMP = "2024-09-05T19:07:00Z"
+
+def token(callsign, timestamp=TIMESTAMP, offset=0):
+    return pyotp.HOTP(base64.b32encode(codes.derive_secret(SECRET, callsign))).at(codes.counter(timestamp) + offset)
+
+class TestClient(unittest.TestCase):
+    def standin(self, **kwargs):
+        standin = upstream_standin.StandIn(**kwargs)
+        self.addCleanup(standin.stop)
+        return standin
+
+    def run_client(self, standin, fn, **kwargs):
+        async def main():
+            async with Client(standin.url, **kwargs) as client:
+                return await fn(client), client
+        return asyncio.run(main())
+
+    def test_pooled_and_bounded(self):
+        standin = self.standin(delay=0.05, verified_ratio=0.5, seed=3)
+        checks = [(f"VK3A{i:02d}", TIMESTAMP, "000000") for i in range(16)]
+        started = time.monotonic()
+        results, client = self.run_client(standin, lambda client: client.check_many(checks), max_connections=4)
+        elapsed = time.monotonic() - started
+        self.assertEqual(len(results), 16)
+        self.assertIn(True, results)
+        self.assertIn(False, results)
+        self.assertEqual(standin.requests, 16)
+        self.assertLessEqual(standin.connections, 4)
+        self.assertGreaterEqual(elapsed, 0.2) # 16 requests, 4 at a time, 50 ms each
+
+    def test_sequential_requests_reuse_connection(self):
+        standin = self.standin()
+        async def run(client):
+            return [await client.check("vk3fur", TIMESTAMP, f"{i:06d}.text") for i in range(5)]
+        results, client = self.run_client(standin, run)
+        self.assertEqual(results, [False] * 5)
+        self.assertEqual(standin.connections, 1)
+        self.assertEqual(client.stats["requests"], 5)
+
+    def test_in_flight_deduplicated(self):
+        standin = self.standin(delay=0.05, body="VK3FUR VERIFIED")
+        results, client = self.run_client(standin, lambda client: client.check_many([("VK3FUR", TIMESTAMP, "123456")] * 10))
+        self.assertEqual(results, [True] * 10)
+        self.assertEqual(standin.requests, 1)
+        self.assertEqual(client.stats["shared"], 9)
+
+    def test_local_secret(self):
+        standin = self.standin()
+        checks = [("VK3FUR", TIMESTAMP, token("VK3FUR")), ("vk3abc", TIMESTAMP, token("VK3ABC") + ".text"), ("VK3FUR", TIMESTAMP, token("VK3FUR", offset=1))]
+        results, client = self.run_client(standin, lambda client: client.check_many(checks), secret=SECRET)
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(standin.requests, 1) # only the miss went out
+        self.assertEqual(client.stats["local"], 2)
+
+        results, client = self.run_client(standin, lambda client: client.check_many(checks[2:]), secret=SECRET, drift=1)
+        self.assertEqual(results, [True])
+
+    def test_local_matches_handler(self):
+        with mock.patch.dict(os.environ, {"SECRET": SECRET}):
+            from fotw import keys
+            with mock.patch.object(keys, "SECRET", SECRET):
+                self.assertEqual(keys.UserKey("VK3FUR").at(codes.counter(TIMESTAMP)), token("VK3FUR"))
+
+    def test_errors(self):
+        standin = self.standin(status=429)
+        with self.assertRaises(ClientError) as context:
+            self.run_client(standin, lambda client: client.check("VK3FUR", TIMESTAMP, "000000"))
+        self.assertEqual(context.exception.status, 429)
+
+    def test_server_closing_idle_connection(self):
+        standin = self.standin()
+        async def run(client):
+            await client.check("VK3FUR", TIMESTAMP, "000000")
+            for reader, writer in client._idle:
+                writer.transport.abort() # as if the server timed it out
+            await asyncio.sleep(0)
+            return await client.check("VK3FUR", TIMESTAMP, "000001")
+        result, client = self.run_client(standin, run)
+        self.assertFalse(result)
+        self.assertEqual(client.stats["connections"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
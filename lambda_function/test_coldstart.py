@@ -0,0 +1,18 @@
+import unittest
+import io
+import contextlib
+
+import coldstart
+
+class TestColdStart(unittest.TestCase):
+    def test_local_run(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = coldstart.main(["-n", "1"])
+        self.assertEqual(set(results["handlers"]), set(coldstart.HANDLERS))
+        for handler, summary in results["handlers"].items():
+            self.assertEqual(summary["outcomes"], ["200"], handler)
+            self.assertGreater(summary["init_ms"]["median"], 0)
+            self.assertGreaterEqual(summary["rss_kb"]["median"], summary["rss_init_kb"]["median"])
+
+if __name__ == '__main__':
+    unittest.main()
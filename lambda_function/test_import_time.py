@@ -0,0 +1,52 @@
+import unittest
+import os
+import sys
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# generous so slow CI boxes don't flap, tighten locally with IMPORT_BUDGET_MS
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", 1000))
+
+def import_times(module):
+    """
+    Runs python -X importtime in a fresh interpreter and returns {module: cumulative microseconds}
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE,
+        env={**os.environ, "SECRET": "1234567890"},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative_us)
+    return times
+
+class TestImportTime(unittest.TestCase):
+    def test_check_is_light(self):
+        times = import_times("fotw.check")
+        for heavy in ("cryptography", "adif_io", "gzip", "urllib.request", "http.client", "sqlite3"):
+            self.assertNotIn(heavy, times)
+        self.assertLess(times["fotw.check"] / 1000, IMPORT_BUDGET_MS)
+
+    def test_verify_defers_cryptography(self):
+        times = import_times("fotw.verify")
+        self.assertNotIn("cryptography", times)
+        self.assertNotIn("adif_io", times)
+        self.assertLess(times["fotw.verify"] / 1000, IMPORT_BUDGET_MS)
+
+    def test_lambda_function_shim(self):
+        times = import_times("lambda_function")
+        self.assertNotIn("fotw.check", times)
+        self.assertNotIn("fotw.verify", times)
+
+if __name__ == '__main__':
+    for module in sys.argv[1:] or ["lambda_function", "fotw.check", "fotw.verify"]:
+        times = import_times(module)
+        print(f"{module}: {times[module] / 1000:.1f} ms")
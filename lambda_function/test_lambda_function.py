@@ -1,7 +1,6 @@
 import unittest
 
 from unittest import mock
-from unittest.mock import Mock
 import os
 import pyotp
 import datetime
@@ -10,12 +9,25 @@ import base64
 from freezegun import freeze_time
 import gzip
 import json
+import io
+import tracemalloc
+import cryptography.x509
+import tq8_fixtures
 
 mock.patch.dict(os.environ, {"SECRET": "1234567890"}, clear=True).start()
 import lambda_function
-lambda_function.VERIFICATION_SIGDATA = "AA9FOTWFT8"
+import fotw.keys
+import fotw.check
+import fotw.verify
+import fotw.result_cache
+import fotw.ratelimit
+fotw.verify.VERIFICATION_SIGDATA = "AA9FOTWFT8"
 
 class TestValidate(unittest.TestCase):
+    def setUp(self):
+        fotw.result_cache.backend = fotw.result_cache.MemoryBackend()
+        fotw.ratelimit.reset()
+
     def test_valid(self):
         
         timestamp = "2024-09-05T19:07:00Z"
@@ -55,16 +67,14 @@ class TestValidate(unittest.TestCase):
         )
         self.assertFalse(output['body'].endswith(" VERIFIED"))
 
-    @mock.patch('urllib.request.urlopen')
-    def test_call_9dx_verified(self, urlopen):
+    @mock.patch('fotw.upstream.fetch')
+    def test_call_9dx_verified(self, fetch):
         timestamp = "2024-09-05T19:07:00Z"
         callsign = "VK3FUR"
 
         code = "000000"
 
-        return_read = Mock()
-        return_read.read.side_effect = ["blah VERIFIED"]
-        urlopen.return_value = return_read
+        fetch.return_value = "blah VERIFIED"
 
         output = lambda_function.validate(
             {
@@ -121,6 +131,274 @@ class TestValidate(unittest.TestCase):
         )
         self.assertTrue(output['body'].endswith(" VERIFIED"))
 
+class TestKeyCache(unittest.TestCase):
+    def test_key_and_token_cached(self):
+        fotw.keys.user_key.cache_clear()
+        key = fotw.keys.user_key("VK3FUR")
+        self.assertIs(key, fotw.keys.user_key("VK3FUR"))
+        self.assertEqual(key.secret, hashlib.sha3_512(("1234567890" + "VK3FUR").encode()).digest()[:10])
+
+        before = fotw.keys.key_cache_info()["tokens"]
+        token = key.at(1000)
+        self.assertEqual(token, pyotp.HOTP(key.secret_b32).at(1000))
+        self.assertEqual(key.at(1000), token)
+        after = fotw.keys.key_cache_info()
+        self.assertEqual(after["tokens"]["misses"] - before["misses"], 1)
+        self.assertEqual(after["tokens"]["hits"] - before["hits"], 1)
+        self.assertEqual(after["keys"]["hits"], 1)
+        self.assertEqual(after["keys"]["misses"], 1)
+
+class TestDriftWindow(unittest.TestCase):
+    def setUp(self):
+        fotw.result_cache.backend = fotw.result_cache.MemoryBackend()
+        fotw.ratelimit.reset()
+
+    @freeze_time("2024-09-05T19:10:00Z")
+    @mock.patch('fotw.upstream.fetch')
+    def test_drift(self, fetch):
+        fetch.return_value = "VK3FUR UNVERIFIED"
+        timestamp = "2024-09-05T19:07:00Z"
+        ts = int(datetime.datetime.fromisoformat(timestamp).timestamp()//30)
+        key = fotw.keys.user_key("VK3FUR")
+        event = lambda code: {"pathParameters": {"callsign": "VK3FUR", "timestamp": timestamp, "code": f"{code}.text"}}
+
+        # off by one window falls through to the upstream without a drift window
+        output = lambda_function.validate(event(key.hotp.at(ts - 1)),{})
+        self.assertFalse(output['body'].endswith(" VERIFIED"))
+
+        with mock.patch.object(fotw.check, "DRIFT_WINDOW", 2):
+            output = lambda_function.validate(event(key.hotp.at(ts - 1)),{})
+            self.assertTrue(output['body'].endswith(" VERIFIED"))
+            self.assertEqual(output['headers']['X-FoTW-Drift'], "-1")
+            output = lambda_function.validate(event(key.hotp.at(ts + 2)),{})
+            self.assertEqual(output['headers']['X-FoTW-Drift'], "2")
+            output = lambda_function.validate(event(key.hotp.at(ts + 3)),{})
+            self.assertFalse(output['body'].endswith(" VERIFIED"))
+
+    def test_window_rolls(self):
+        key = fotw.keys.UserKey("VK3FUR")
+        with mock.patch.object(key.hotp, "at", wraps=key.hotp.at) as at:
+            key.match(1000, "000000", 3)
+            self.assertEqual(at.call_count, 7)
+            key.match(1001, "000000", 3)
+            self.assertEqual(at.call_count, 8)
+        self.assertEqual(key.match(1001, key.hotp.at(998), 3), -3)
+
+    def test_shared_between_threads(self):
+        # the server runs validate on a thread pool, so one UserKey gets hit from several threads at once
+        import sys
+        import concurrent.futures
+        key = fotw.keys.UserKey("VK3FUR")
+        expected = {counter: key.hotp.at(counter) for counter in range(0, 2100)}
+        def work(start):
+            for counter in range(start, start + 1000):
+                drift = counter % 3
+                self.assertEqual(key.match(counter, expected[counter + drift], 2), drift)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6) # switch threads as often as possible to shake out races
+        self.addCleanup(sys.setswitchinterval, interval)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(work, [10, 300, 600, 900]))
+
+class TestCacheHeaders(unittest.TestCase):
+    def setUp(self):
+        fotw.result_cache.backend = fotw.result_cache.MemoryBackend()
+        fotw.ratelimit.reset()
+
+    def event(self, code, timestamp="2024-09-05T19:07:00Z", headers=None):
+        return {"pathParameters": {"callsign": "VK3FUR", "timestamp": timestamp, "code": f"{code}.text"}, "headers": headers}
+
+    @freeze_time("2024-09-05T19:10:00Z")
+    @mock.patch('fotw.upstream.fetch')
+    def test_max_age(self, fetch):
+        fetch.return_value = "VK3FUR UNVERIFIED"
+        ts = int(datetime.datetime.fromisoformat("2024-09-05T19:07:00Z").timestamp()//30)
+        code = fotw.keys.user_key("VK3FUR").hotp.at(ts)
+
+        output = lambda_function.validate(self.event(code), {})
+        self.assertEqual(output['headers']['Cache-Control'], f"public, max-age={fotw.check.CACHE_MAX_AGE_VERIFIED}")
+        output = lambda_function.validate(self.event("000000", "2024-09-05T18:00:00Z"), {})
+        self.assertEqual(output['headers']['Cache-Control'], f"public, max-age={fotw.check.CACHE_MAX_AGE_UNVERIFIED}")
+        # 9dx.cc might not have heard about it yet
+        output = lambda_function.validate(self.event("000000"), {})
+        self.assertEqual(output['headers']['Cache-Control'], f"public, max-age={fotw.check.CACHE_MAX_AGE_RECENT}")
+
+    @freeze_time("2024-09-05T19:10:00Z")
+    @mock.patch('fotw.upstream.fetch')
+    def test_if_none_match(self, fetch):
+        fetch.return_value = "VK3FUR UNVERIFIED"
+        ts = int(datetime.datetime.fromisoformat("2024-09-05T19:07:00Z").timestamp()//30)
+        code = fotw.keys.user_key("VK3FUR").hotp.at(ts)
+
+        output = lambda_function.validate(self.event(code), {})
+        etag = output['headers']['ETag']
+        self.assertEqual(output['statusCode'], 200)
+
+        output = lambda_function.validate(self.event(code, headers={"If-None-Match": f'"nope", {etag}'}), {})
+        self.assertEqual(output['statusCode'], 304)
+        self.assertEqual(output['body'], "")
+        self.assertEqual(output['headers']['ETag'], etag)
+
+        # same tag doesn't cover a different answer
+        output = lambda_function.validate(self.event("000000", headers={"if-none-match": etag}), {})
+        self.assertEqual(output['statusCode'], 200)
+        self.assertEqual(output['body'], "VK3FUR UNVERIFIED")
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        fotw.result_cache.backend = fotw.result_cache.MemoryBackend()
+        fotw.ratelimit.reset()
+
+    def event(self, callsign, code, ip=None):
+        event = {"pathParameters": {"callsign": callsign, "timestamp": "2024-09-05T19:07:00Z", "code": f"{code}.text"}}
+        if ip:
+            event["requestContext"] = {"identity": {"sourceIp": ip}}
+        return event
+
+    @mock.patch('fotw.upstream.fetch')
+    def test_callsign_bucket(self, fetch):
+        fetch.return_value = "VK3FUR UNVERIFIED"
+        with mock.patch.object(fotw.ratelimit, "callsigns", fotw.ratelimit.Limiter(rate=0.5, burst=3)):
+            for i in range(3):
+                self.assertEqual(lambda_function.validate(self.event("VK3FUR", f"00000{i}"), {})['statusCode'], 200)
+            output = lambda_function.validate(self.event("VK3FUR", "000009"), {})
+            self.assertEqual(output['statusCode'], 429)
+            self.assertEqual(output['body'], "VK3FUR UNVERIFIED")
+            self.assertEqual(output['headers']['Retry-After'], "2")
+            self.assertEqual(fetch.call_count, 3)
+
+            # cached answers and other callsigns aren't limited
+            self.assertEqual(lambda_function.validate(self.event("VK3FUR", "000000"), {})['statusCode'], 200)
+            self.assertEqual(lambda_function.validate(self.event("VK3ABC", "000000"), {})['statusCode'], 200)
+
+    @mock.patch('fotw.upstream.fetch')
+    def test_ip_bucket(self, fetch):
+        fetch.return_value = "UNVERIFIED"
+        with mock.patch.object(fotw.ratelimit, "ips", fotw.ratelimit.Limiter(rate=1, burst=2)):
+            statuses = [lambda_function.validate(self.event(f"VK3A{i}", "000000", "192.0.2.1"), {})['statusCode'] for i in range(4)]
+            self.assertEqual(statuses, [200, 200, 429, 429])
+            self.assertEqual(lambda_function.validate(self.event("VK3A9", "000000", "192.0.2.2"), {})['statusCode'], 200)
+            # the callsign wasn't charged for the request the IP bucket turned away
+            self.assertEqual(fotw.ratelimit.callsigns.buckets["VK3A2"][0], fotw.ratelimit.BURST)
+
+    @mock.patch('fotw.upstream.fetch')
+    def test_ip_bucket_behind_cloudfront(self, fetch):
+        # API Gateway only sees the CloudFront edge, everyone going through it shares that sourceIp
+        fetch.return_value = "UNVERIFIED"
+        def event(callsign, viewer=None, forwarded=None):
+            event = self.event(callsign, "000000", "130.176.0.1")
+            event["headers"] = {"Via": "2.0 abc.cloudfront.net (CloudFront)"}
+            if viewer:
+                event["headers"]["CloudFront-Viewer-Address"] = viewer
+            if forwarded:
+                event["headers"]["X-Forwarded-For"] = forwarded
+            return event
+        fotw.check._trusted_networks.cache_clear()
+        self.addCleanup(fotw.check._trusted_networks.cache_clear)
+        patch = mock.patch.object(fotw.check, "TRUSTED_PROXIES", "130.176.0.0/16, 2600:9000::/28")
+        patch.start()
+        self.addCleanup(patch.stop)
+        with mock.patch.object(fotw.ratelimit, "ips", fotw.ratelimit.Limiter(rate=1, burst=2)):
+            statuses = [lambda_function.validate(event(f"VK3A{i}", viewer=f"198.51.100.{i}:46532"), {})['statusCode'] for i in range(4)]
+            self.assertEqual(statuses, [200, 200, 200, 200])
+            self.assertIn("198.51.100.3", fotw.ratelimit.ips.buckets)
+            self.assertNotIn("130.176.0.1", fotw.ratelimit.ips.buckets)
+
+            statuses = [lambda_function.validate(event(f"VK3B{i}", viewer="2001:db8::1:46532"), {})['statusCode'] for i in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+
+            # without the viewer header, the hop the edge added - not whatever the client put in front of it
+            statuses = [lambda_function.validate(event(f"VK3C{i}", forwarded=f"10.9.9.{i}, 203.0.113.7, 130.176.0.1"), {})['statusCode'] for i in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(fotw.check._source_ip(event("VK3FUR", forwarded="203.0.113.8")), "203.0.113.8")
+        self.assertEqual(fotw.check._source_ip(event("VK3FUR", forwarded="203.0.113.8, 130.176.9.9")), "203.0.113.8") # two edges
+        self.assertEqual(fotw.check._source_ip(event("VK3FUR")), "130.176.0.1")
+
+    def test_forwarded_headers_need_trusted_proxy(self):
+        # straight to execute-api or fotw.server: the headers are the client's own
+        event = self.event("VK3FUR", "000000", "192.0.2.1")
+        event["headers"] = {"CloudFront-Viewer-Address": "198.51.100.1:443", "X-Forwarded-For": "198.51.100.2"}
+        self.assertEqual(fotw.check._source_ip(event), "192.0.2.1")
+        fotw.check._trusted_networks.cache_clear()
+        self.addCleanup(fotw.check._trusted_networks.cache_clear)
+        with mock.patch.object(fotw.check, "TRUSTED_PROXIES", "130.176.0.0/16"):
+            self.assertEqual(fotw.check._source_ip(event), "192.0.2.1")
+            event["requestContext"]["identity"]["sourceIp"] = "130.176.0.1"
+            self.assertEqual(fotw.check._source_ip(event), "198.51.100.1")
+
+    def test_refill(self):
+        limiter = fotw.ratelimit.Limiter(rate=2, burst=2, max_keys=2)
+        limiter.take("a", now=0)
+        limiter.take("a", now=0)
+        with self.assertRaises(fotw.ratelimit.RateLimited) as context:
+            limiter.take("a", now=0.1)
+        self.assertAlmostEqual(context.exception.retry_after, 0.4)
+        limiter.take("a", now=0.5)
+        limiter.take("b", now=0.5)
+        limiter.take("c", now=0.5)
+        self.assertEqual(list(limiter.buckets), ["b", "c"])
+
+class TestValidateBatch(unittest.TestCase):
+    def setUp(self):
+        fotw.result_cache.backend = fotw.result_cache.MemoryBackend()
+        fotw.ratelimit.reset()
+
+    @freeze_time("2024-09-05T19:10:00Z")
+    @mock.patch('fotw.upstream.fetch')
+    def test_batch(self, fetch):
+        timestamp = "2024-09-05T19:07:00Z"
+        user_secret = hashlib.sha3_512(("1234567890" + "VK3FUR").encode()).digest()[:10]
+        user_secret_b32 = base64.b32encode(user_secret)
+        ts = int(datetime.datetime.fromisoformat(timestamp).timestamp()//30)
+        code = pyotp.HOTP(user_secret_b32).at(ts)
+
+        def fake_9dx(upstream, path):
+            return "VK3ABC VERIFIED" if "/VK3ABC/" in path else "VK3XYZ UNVERIFIED"
+        fetch.side_effect = fake_9dx
+
+        output = lambda_function.validate_batch(
+            {
+                "body": json.dumps([
+                    {"callsign": "vk3fur", "timestamp": timestamp, "code": f"{code}.text"},
+                    {"callsign": "VK3ABC", "timestamp": timestamp, "code": "000000"},
+                    {"callsign": "VK3XYZ", "timestamp": timestamp, "code": "000000"},
+                    {"callsign": "VK3FUR", "timestamp": "2024-09-05T19:17:00Z", "code": code},
+                ])
+            },{}
+        )
+        results = json.loads(output['body'])
+        self.assertEqual([result['status'] for result in results], ["VERIFIED", "VERIFIED", "UNVERIFIED", "ERROR"])
+        self.assertEqual(results[0]['callsign'], "VK3FUR")
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_batch_malformed_entries(self):
+        output = lambda_function.validate_batch(
+            {
+                "body": json.dumps([
+                    1,
+                    {"callsign": "VK3FUR", "timestamp": "2024-09-05T19:07:00Z"},
+                    {"callsign": "VK3FUR"},
+                    {"callsign": "VK3FUR", "timestamp": "not a time", "code": "000000"},
+                ])
+            },{}
+        )
+        self.assertEqual(output['statusCode'], 200)
+        results = json.loads(output['body'])
+        self.assertEqual([result['status'] for result in results], ["ERROR"] * 4)
+        self.assertEqual([result['error'] for result in results[:3]], [
+            "Expected an object with callsign, timestamp and code",
+            "Missing code",
+            "Missing timestamp, code",
+        ])
+
+    def test_batch_too_large(self):
+        with self.assertRaises(ValueError):
+            lambda_function.validate_batch(
+                {
+                    "body": json.dumps([{"callsign": "VK3FUR", "timestamp": "2024-09-05T19:07:00Z", "code": "000000"}] * (fotw.check.BATCH_MAX + 1))
+                },{}
+            )
+
 # Note that AA9FOTW is used instead of ZZ9FOTW for testing as we don't want to commit a signed log to the repo
 EXAMPLE_TQ8 = """
 <TQSL_IDENT:54>TQSL V2.7.5 Lib: V2.5 Config: V11.29 AllowDupes: false
@@ -517,6 +795,143 @@ class TestVerify(unittest.TestCase):
             )
             self.assertEqual(context, "Log QSO dates too far out of range")
 
+    def test_cert_cached(self):
+        fotw.verify._cert_cache.clear()
+        body = base64.encodebytes(gzip.compress(EXAMPLE_TQ8.encode()))
+        with mock.patch('cryptography.x509.load_der_x509_certificate', wraps=cryptography.x509.load_der_x509_certificate) as load:
+            lambda_function.verify({"body": body},{})
+            output = lambda_function.verify({"body": body},{})
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(json.loads(output['body'])['callsign'],"VK3FUR")
+
+        # dates still apply to cached certs
+        with freeze_time("2026-03-27"):
+            with self.assertRaises(ValueError):
+                lambda_function.verify({"body": body},{})
+
+    def test_memo(self):
+        body = base64.encodebytes(gzip.compress(EXAMPLE_TQ8.encode()))
+        with mock.patch.object(fotw.verify, "VERIFY_MEMO_SIZE", 8):
+            fotw.verify._verify_memo.clear()
+            output = lambda_function.verify({"body": body},{})
+            with mock.patch('fotw.tq8.iter_records') as iter_records:
+                self.assertEqual(lambda_function.verify({"body": body},{}), output)
+            iter_records.assert_not_called()
+
+            with freeze_time("2024-05-25"):
+                with self.assertRaises(ValueError):
+                    lambda_function.verify({"body": body},{})
+
+# made at import, before any frozen test runs. cryptography holds on to whichever datetime class it sees first,
+# so certs built after a @freeze_time test would be handed a real datetime when it expects freezegun's
+MULTI_GROUP_CA = tq8_fixtures.TestCA()
+MULTI_GROUP_USERS = [MULTI_GROUP_CA.issue(callsign) for callsign in ("VK3FUR", "VK3ABC", "VK3XYZ")]
+STRANGER = tq8_fixtures.TestCA("Someone Else").issue("VK3BAD")
+
+class TestVerifyMultiGroup(unittest.TestCase):
+    ca = MULTI_GROUP_CA
+    users = MULTI_GROUP_USERS
+
+    def setUp(self):
+        for patch in (mock.patch.object(fotw.verify, "ca", lambda: self.ca.cert), mock.patch.object(fotw.verify, "VERIFICATION_SIGDATA", "ZZ9FOTWFT8")):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(fotw.verify._cert_cache.clear)
+
+    def event(self, users):
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        return {"body": base64.b64encode(gzip.compress(tq8_fixtures.make_tq8([(user, now) for user in users]).encode())).decode()}
+
+    def test_single_group_unchanged(self):
+        body = json.loads(lambda_function.verify(self.event(self.users[:1]), {})['body'])
+        self.assertEqual(body, {"callsign": "VK3FUR", "secret": fotw.keys.user_key("VK3FUR").secret_b32.decode()})
+
+    def test_several_certs(self):
+        body = json.loads(lambda_function.verify(self.event(self.users), {})['body'])
+        self.assertEqual(body['callsign'], "VK3FUR")
+        self.assertEqual(body['results'], [
+            {"group": i, "callsign": user.callsign, "secret": fotw.keys.user_key(user.callsign).secret_b32.decode()} for i, user in enumerate(self.users)
+        ])
+
+    def test_one_bad_group(self):
+        stranger = STRANGER
+        body = json.loads(lambda_function.verify(self.event([self.users[0], stranger, self.users[1]]), {})['body'])
+        self.assertEqual(body['callsign'], "VK3FUR")
+        # log order, so the client can tell which one failed
+        self.assertEqual([(result['group'], result.get('callsign')) for result in body['results']], [(0, "VK3FUR"), (1, None), (2, "VK3ABC")])
+        self.assertEqual(body['results'][1], {"group": 1, "error": "Cert not issued by LoTW"})
+        # the top level callsign is the first one that verified, not the first group
+        body = json.loads(lambda_function.verify(self.event([stranger] + self.users[:2]), {})['body'])
+        self.assertEqual(body['callsign'], "VK3FUR")
+        self.assertEqual(body['results'][0], {"group": 0, "error": "Cert not issued by LoTW"})
+
+        with self.assertRaises(ValueError):
+            lambda_function.verify(self.event([stranger, stranger]), {})
+
+    def test_limits(self):
+        with mock.patch.object(fotw.verify, "VERIFY_MAX_GROUPS", 2):
+            with self.assertRaises(ValueError):
+                lambda_function.verify(self.event(self.users), {})
+        with mock.patch.object(fotw.verify, "VERIFY_MAX_BODY", 1000):
+            with self.assertRaises(ValueError):
+                lambda_function.verify(self.event(self.users[:1]), {})
+
+    def test_groups_must_line_up(self):
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        log = tq8_fixtures.make_tq8([(user, now) for user in self.users[:2]])
+        for broken in (log.replace("<CERT_UID:1>2", "<CERT_UID:1>1"), log.replace("<STATION_UID:1>2", "<STATION_UID:1>1")):
+            with self.assertRaises(ValueError):
+                lambda_function.verify({"body": base64.b64encode(gzip.compress(broken.encode())).decode()}, {})
+
+def gzip_bomb(prefix=b"", size=64 * 1024 * 1024):
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=9) as f:
+        f.write(prefix)
+        zeros = bytes(1024 * 1024)
+        for _ in range(size // len(zeros)):
+            f.write(zeros)
+    return out.getvalue()
+
+class TestVerifyLimits(unittest.TestCase):
+    def verify(self, data):
+        with self.assertRaises(ValueError) as context:
+            tracemalloc.start()
+            try:
+                lambda_function.verify({"body": base64.b64encode(data).decode()}, {})
+            finally:
+                self.peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        return str(context.exception)
+
+    def test_gzip_bomb(self):
+        bomb = gzip_bomb()
+        self.assertLess(len(base64.b64encode(bomb)), fotw.verify.VERIFY_MAX_BODY)
+        self.assertEqual(self.verify(bomb), "Log too large")
+        self.assertLess(self.peak, 4 * 1024 * 1024)
+
+    def test_bomb_inside_a_field(self):
+        # a field claiming to be huge keeps the parser asking for more
+        self.assertEqual(self.verify(gzip_bomb(b"<Rec_Type:5>tCERT<CERTIFICATE:100000000>")), "Log too large")
+        self.assertLess(self.peak, 4 * 1024 * 1024)
+
+    def test_stops_once_records_read(self):
+        records = b"<CALL:6>VK3FUR<eor>" * (fotw.verify.VERIFY_MAX_GROUPS * 3 + 1)
+        self.assertEqual(self.verify(gzip_bomb(records)), "Log contains too many records")
+
+    def test_oversized_input(self):
+        with mock.patch.object(fotw.verify, "VERIFY_MAX_BODY", 1024):
+            self.assertEqual(self.verify(os.urandom(1024)), "Log too large")
+
+    def test_not_gzip(self):
+        self.assertEqual(self.verify(b"definitely not a log"), "Log not gzipped")
+        self.assertEqual(self.verify(gzip.compress(EXAMPLE_TQ8.encode())[:-20]), "Log not gzipped")
+        self.assertEqual(self.verify(b""), "Log not gzipped")
+
+    def test_limit(self):
+        body = gzip.compress(EXAMPLE_TQ8.encode())
+        with mock.patch.object(fotw.verify, "VERIFY_MAX_DECOMPRESSED", len(EXAMPLE_TQ8) - 1):
+            self.assertEqual(self.verify(body), "Log too large")
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import unittest
+from unittest import mock
+import os
+import io
+import json
+import gzip
+import base64
+import datetime
+import contextlib
+import tq8_fixtures
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+from freezegun import freeze_time
+from fotw import metrics, check, verify, result_cache, ratelimit
+import test_lambda_function
+
+real_emit = metrics.emit
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(metrics, "ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lines = []
+        patcher = mock.patch.object(metrics, "emit", self.lines.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ratelimit.reset()
+
+    def test_disabled(self):
+        with mock.patch.object(metrics, "ENABLED", False):
+            self.assertIs(metrics.start("validate"), metrics.NULL)
+            with self.assertRaises(ValueError):
+                check.validate({"pathParameters": {"callsign": "VK3FUR", "timestamp": "2099-01-01T00:00:00Z", "code": "000000"}}, None)
+        self.assertEqual(self.lines, [])
+
+    def test_emf_line(self):
+        stdout = io.StringIO()
+        with mock.patch.object(metrics, "emit", real_emit), contextlib.redirect_stdout(stdout):
+            metric = metrics.start("verify")
+            with metric.stage("decode"):
+                pass
+            metric.finish("rejected", "Log not gzipped")
+        line = json.loads(stdout.getvalue())
+        self.assertEqual(line["Handler"], "verify")
+        self.assertEqual(line["Outcome"], "rejected")
+        self.assertEqual(line["Reason"], "Log not gzipped")
+        self.assertIn("decode_ms", line)
+        names = [metric["Name"] for metric in line["_aws"]["CloudWatchMetrics"][0]["Metrics"]]
+        self.assertEqual(sorted(names), ["decode_ms", "total_ms"])
+
+    def test_validate_stages(self):
+        with mock.patch.object(result_cache, "backend", result_cache.MemoryBackend()), mock.patch("fotw.upstream.fetch", return_value="VK3FUR UNVERIFIED"):
+            check.validate({"pathParameters": {"callsign": "VK3FUR", "timestamp": "2024-09-05T19:07:00Z", "code": "000000"}}, None)
+        line, = self.lines
+        self.assertEqual(line["Outcome"], "unverified")
+        self.assertIn("hotp_ms", line)
+        self.assertIn("upstream_ms", line)
+
+    @freeze_time("2024-10-25")
+    def test_verify_stages(self):
+        verify._cert_cache.clear()
+        verify.verify({"body": base64.encodebytes(gzip.compress(test_lambda_function.EXAMPLE_TQ8.encode()))}, None)
+        line, = self.lines
+        self.assertEqual(line["Outcome"], "ok")
+        self.assertEqual(line["cert_cache"], "miss")
+        for stage in ("decode", "parse", "x509_load", "chain", "signature", "derive"):
+            self.assertIn(f"{stage}_ms", line)
+
+    def test_verify_multi_group(self):
+        ca = tq8_fixtures.TestCA()
+        users = [ca.issue("VK3FUR"), ca.issue("VK3ABC")]
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        body = base64.b64encode(gzip.compress(tq8_fixtures.make_tq8([(user, now) for user in users]).encode()))
+        with mock.patch.object(verify, "ca", lambda: ca.cert), mock.patch.object(verify, "VERIFICATION_SIGDATA", "ZZ9FOTWFT8"):
+            self.addCleanup(verify._cert_cache.clear)
+            verify.verify({"body": body}, None)
+        line, = self.lines
+        self.assertEqual(line["groups"], 2)
+        self.assertIn("groups_ms", line)
+        self.assertNotIn("signature_ms", line)
+
+    def test_rejection_reason(self):
+        with self.assertRaises(ValueError):
+            verify.verify({"body": base64.b64encode(b"nope")}, None)
+        line, = self.lines
+        self.assertEqual((line["Outcome"], line["Reason"]), ("rejected", "Log not gzipped"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from unittest import mock
+import os
+import io
+import json
+import tempfile
+import threading
+import contextlib
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+from fotw import metrics, profiling, check, ratelimit
+
+FUTURE = {"pathParameters": {"callsign": "VK3FUR", "timestamp": "2099-01-01T00:00:00Z", "code": "000000"}}
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.lines = []
+        patcher = mock.patch.object(metrics, "emit", self.lines.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ratelimit.reset()
+
+    def profiles(self):
+        return [line for line in self.lines if "fotw_profile" in line]
+
+    def test_off_by_default(self):
+        with mock.patch.object(profiling, "RATE", 0), mock.patch.object(profiling, "run") as run:
+            with self.assertRaises(ValueError):
+                check.validate(FUTURE, None)
+        run.assert_not_called()
+        self.assertEqual(self.profiles(), [])
+
+    def test_event_flag(self):
+        with mock.patch.object(profiling, "RATE", 0):
+            with self.assertRaises(ValueError):
+                check.validate({**FUTURE, "fotwProfile": True}, None)
+        [profile] = self.profiles()
+        self.assertEqual(profile["fotw_profile"], "validate")
+        self.assertGreater(profile["ms"], 0)
+        self.assertTrue(any("fotw/check.py" in row[0] for row in profile["functions"]))
+        for where, calls, own, cumulative in profile["functions"]:
+            self.assertLessEqual(own, cumulative + 0.001)
+        self.assertLessEqual(len(profile["functions"]), profiling.TOP)
+
+    def test_rate(self):
+        with mock.patch.object(profiling, "RATE", 1.0):
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    check.validate(FUTURE, None)
+        self.assertEqual(len(self.profiles()), 3)
+        with mock.patch.object(profiling, "RATE", 0.5), mock.patch("random.random", side_effect=[0.9, 0.1]):
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    check.validate(FUTURE, None)
+        self.assertEqual(len(self.profiles()), 4)
+
+    def test_allocations(self):
+        def handler(event, context, metric):
+            event["keep"] = [bytearray(1024) for _ in range(64)]
+            return {}
+        profiling.run("test", handler, {}, None, metrics.NULL)
+        [profile] = self.profiles()
+        self.assertGreaterEqual(profile["peak_kb"], 64)
+        [where, kb, blocks] = profile["allocations"][0]
+        self.assertIn("test_profiling.py", where)
+        self.assertGreaterEqual(kb, 64)
+
+    def test_one_at_a_time(self):
+        inside = threading.Event()
+        release = threading.Event()
+        def slow(event, context, metric):
+            inside.set()
+            release.wait(5)
+            return "slow"
+        results = []
+        thread = threading.Thread(target=lambda: results.append(profiling.run("slow", slow, {}, None, metrics.NULL)))
+        thread.start()
+        inside.wait(5)
+        # overlapping sample runs unprofiled rather than fighting over tracemalloc
+        self.assertEqual(profiling.run("fast", lambda event, context, metric: "fast", {}, None, metrics.NULL), "fast")
+        release.set()
+        thread.join(5)
+        self.assertEqual(results, ["slow"])
+        self.assertEqual([profile["fotw_profile"] for profile in self.profiles()], ["slow"])
+        self.assertEqual(profiling.run("again", lambda event, context, metric: "again", {}, None, metrics.NULL), "again")
+        self.assertEqual(len(self.profiles()), 2)
+
+    def test_profile_failure_keeps_response(self):
+        import tracemalloc
+        def handler(event, context, metric):
+            tracemalloc.stop() # pulled out from under it
+            return {"statusCode": 200}
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(profiling.run("test", handler, {}, None, metrics.NULL), {"statusCode": 200})
+        self.assertEqual(self.profiles(), [])
+        self.assertIn("fotw profile for test failed", stderr.getvalue())
+
+    def test_merge(self):
+        lines = [
+            "2024-09-05T19:07:00Z abc INFO " + json.dumps({"fotw_profile": "verify", "ms": 10, "peak_kb": 5, "functions": [["a.py:1(f)", 2, 3.0, 4.0]], "allocations": [["a.py:2()", 1.5, 3]]}),
+            json.dumps({"fotw_profile": "verify", "ms": 30, "peak_kb": 9, "functions": [["a.py:1(f)", 1, 1.0, 2.0], ["b.py:1(g)", 1, 5.0, 5.0]], "allocations": []}),
+            json.dumps({"_aws": {}, "Handler": "verify"}),
+            "START RequestId: abc {not json",
+        ]
+        report = profiling.merge(profiling.iter_profiles(lines))
+        self.assertEqual(list(report), ["verify"])
+        entry = report["verify"]
+        self.assertEqual((entry["samples"], entry["ms"], entry["peak_kb_max"]), (2, 40, 9))
+        self.assertEqual(entry["functions"]["a.py:1(f)"], [3, 4.0, 6.0, 2])
+        self.assertEqual(entry["allocations"]["a.py:2()"], [1.5, 3, 1])
+        out = io.StringIO()
+        profiling.print_report(report, 10, out)
+        self.assertIn("verify: 2 samples, 20.0 ms average", out.getvalue())
+        self.assertLess(out.getvalue().index("b.py:1(g)"), out.getvalue().index("a.py:1(f)"))
+
+    def test_merge_cli(self):
+        with mock.patch.object(profiling, "RATE", 0):
+            with self.assertRaises(ValueError):
+                check.validate({**FUTURE, "fotwProfile": 1}, None)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "log.txt")
+        with open(path, "w") as f:
+            for line in self.lines:
+                f.write(json.dumps(line) + "\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = profiling.main(["merge", path, "-k", "validate"])
+            self.assertEqual(report["validate"]["samples"], 1)
+            self.assertEqual(profiling.main(["merge", path, "-k", "verify"]), {})
+
+if __name__ == '__main__':
+    unittest.main()
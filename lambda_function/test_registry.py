@@ -0,0 +1,206 @@
+import unittest
+from unittest import mock
+import os
+import io
+import gzip
+import json
+import base64
+import datetime
+import tempfile
+import contextlib
+import tq8_fixtures
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+from freezegun import freeze_time
+from fotw import sortedindex, registry, check, verify, keys, codes, result_cache, ratelimit, metrics
+
+TIMESTAMP = "2024-09-05T19:07:00Z"
+
+def code_for(callsign):
+    return keys.user_key(callsign).at(codes.counter(TIMESTAMP))
+
+class TempDir(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+class TestSortedIndex(TempDir):
+    def test_lookup(self):
+        keys = [os.urandom(8) for _ in range(1000)]
+        self.assertEqual(sortedindex.build(self.path("idx"), keys + keys[:10], 8, tag=42), 1000)
+        index = sortedindex.open_index(self.path("idx"))
+        self.addCleanup(index.close)
+        self.assertEqual((len(index), index.width, index.tag), (1000, 8, 42))
+        self.assertEqual(list(index), sorted(keys))
+        for key in keys:
+            self.assertIn(key, index)
+        for _ in range(1000):
+            key = os.urandom(8)
+            self.assertEqual(key in index, key in keys)
+        self.assertNotIn(b"\x00" * 8, index)
+        self.assertNotIn(b"\xff" * 8, index)
+        self.assertNotIn(keys[0][:4], index)
+
+    def test_empty(self):
+        sortedindex.build(self.path("idx"), [], 4)
+        index = sortedindex.open_index(self.path("idx"))
+        self.addCleanup(index.close)
+        self.assertNotIn(b"abcd", index)
+
+    def test_bad_files(self):
+        with self.assertRaises(ValueError):
+            sortedindex.build(self.path("idx"), [b"abc"], 4)
+        for contents in (b"", b"not an index at all, just some bytes", sortedindex.HEADER.pack(sortedindex.MAGIC, 4, 0, 2, 0) + b"abcd"):
+            with open(self.path("bad"), "wb") as f:
+                f.write(contents)
+            with self.assertRaises(ValueError):
+                sortedindex.open_index(self.path("bad"))
+
+class TestRegistry(TempDir):
+    def setUp(self):
+        super().setUp()
+        for patch in (
+            mock.patch.object(registry, "ISSUANCE_LOG", self.path("issuance.log")),
+            mock.patch.object(registry, "REGISTRY_INDEX", self.path("registry.idx")),
+            mock.patch.object(registry, "REGISTRY_CHECK_SECONDS", 0),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        registry.reload()
+        self.addCleanup(registry.reload)
+        result_cache.backend = result_cache.MemoryBackend()
+        ratelimit.reset()
+
+    def event(self, callsign, code):
+        return {"pathParameters": {"callsign": callsign, "timestamp": TIMESTAMP, "code": f"{code}.text"}}
+
+    def test_no_index(self):
+        with mock.patch.object(registry, "REGISTRY_INDEX", None):
+            registry.reload()
+            self.assertTrue(registry.is_registered("VK3FUR"))
+        registry.reload()
+        self.assertTrue(registry.is_registered("VK3FUR")) # configured but missing
+
+    def test_build(self):
+        registry.record([("VK3FUR", 1), ("VK3ABC", 2)])
+        registry.record([("VK3FUR", 3)])
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(registry.main(["build", self.path("issuance.log"), self.path("registry.idx")]), 2)
+        # half written line at the end is left for next time
+        with open(self.path("issuance.log"), "a") as f:
+            f.write("2024-09-05T19:07:00Z VK3XYZ 4\n2024-09-05T19:07:00Z VK3QQQ")
+        self.assertTrue(registry.is_registered("VK3FUR"))
+        self.assertTrue(registry.is_registered("vk3abc"))
+        self.assertTrue(registry.is_registered("VK3XYZ")) # logged after the index was built
+        self.assertFalse(registry.is_registered("VK3QQQ"))
+        self.assertFalse(registry.is_registered("VK3NOPE"))
+
+    def test_warm_container(self):
+        registry.record([("VK3FUR", 1)])
+        registry.build(self.path("issuance.log"), self.path("registry.idx"))
+        self.assertFalse(registry.is_registered("VK3ABC"))
+        # registered after the first lookup
+        registry.record([("VK3ABC", 2)])
+        self.assertTrue(registry.is_registered("VK3ABC"))
+        # a rebuilt index takes over from where it got to in the log
+        registry.build(self.path("issuance.log"), self.path("registry.idx"))
+        registry.record([("VK3XYZ", 3)])
+        self.assertTrue(registry.is_registered("VK3ABC"))
+        self.assertTrue(registry.is_registered("VK3XYZ"))
+        self.assertEqual(registry._registry.recent, {registry.key("VK3XYZ")})
+
+        # only looks again every REGISTRY_CHECK_SECONDS
+        with mock.patch.object(registry, "REGISTRY_CHECK_SECONDS", 3600):
+            registry.reload()
+            self.assertFalse(registry.is_registered("VK3NEW"))
+            registry.record([("VK3NEW", 4)])
+            self.assertFalse(registry.is_registered("VK3NEW"))
+            registry._registry.checked -= 3600
+            self.assertTrue(registry.is_registered("VK3NEW"))
+
+    def test_record_failure(self):
+        with mock.patch.object(registry, "ISSUANCE_LOG", self.dir + "/missing/issuance.log"):
+            self.assertFalse(registry.record([("VK3FUR", 1)]))
+        with mock.patch.object(registry, "ISSUANCE_LOG", None):
+            self.assertTrue(registry.record([("VK3FUR", 1)]))
+
+    @freeze_time("2024-09-05T19:10:00Z")
+    @mock.patch("fotw.upstream.fetch")
+    @mock.patch.object(check, "user_key", wraps=check.user_key)
+    def test_validate(self, user_key, fetch):
+        registry.record([("VK3FUR", 1)])
+        registry.build(self.path("issuance.log"), self.path("registry.idx"))
+        fetch.return_value = "VK3ABC VERIFIED"
+
+        # registered, local as always
+        self.assertEqual(check.validate(self.event("VK3FUR", code_for("VK3FUR")), {})["body"], "VK3FUR VERIFIED")
+        fetch.assert_not_called()
+        # not registered, straight upstream without any HOTP
+        user_key.reset_mock()
+        self.assertEqual(check.validate(self.event("VK3ABC", "123456"), {})["body"], "VK3ABC VERIFIED")
+        self.assertEqual(fetch.call_count, 1)
+        user_key.assert_not_called()
+        with self.assertRaisesRegex(ValueError, "Time in future"):
+            check.validate({"pathParameters": {"callsign": "VK3ABC", "timestamp": "2099-01-01T00:00:00Z", "code": "123456"}}, {})
+
+        # registered since the index was built and the upstream doesn't know them
+        fetch.return_value = "VK3NEW UNVERIFIED"
+        output = check.validate(self.event("VK3NEW", code_for("VK3NEW")), {})
+        self.assertEqual(output["body"], "VK3NEW VERIFIED")
+        self.assertEqual(output["headers"]["X-FoTW-Drift"], "0")
+        self.assertEqual(check.validate(self.event("VK3NEW", "000000"), {})["body"], "VK3NEW UNVERIFIED")
+
+        # rate limited upstream still gets the local check
+        with mock.patch.object(ratelimit, "callsigns", ratelimit.Limiter(rate=1, burst=0)):
+            self.assertEqual(check.validate(self.event("VK3OTHER", code_for("VK3OTHER")), {})["statusCode"], 200)
+            self.assertEqual(check.validate(self.event("VK3OTHER", "000001"), {})["statusCode"], 429)
+
+    @freeze_time("2024-09-05T19:10:00Z")
+    @mock.patch("fotw.upstream.fetch")
+    def test_batch(self, fetch):
+        registry.record([("VK3FUR", 1)])
+        registry.build(self.path("issuance.log"), self.path("registry.idx"))
+        fetch.side_effect = lambda upstream, path: "VK3ABC VERIFIED" if "/VK3ABC/" in path else "UNVERIFIED"
+        checks = [
+            {"callsign": "VK3FUR", "timestamp": TIMESTAMP, "code": code_for("VK3FUR")},
+            {"callsign": "VK3ABC", "timestamp": TIMESTAMP, "code": "123456"},
+            {"callsign": "VK3NEW", "timestamp": TIMESTAMP, "code": code_for("VK3NEW")},
+            {"callsign": "VK3BAD", "timestamp": TIMESTAMP, "code": "000000"},
+            {"callsign": "VK3BAD", "timestamp": "2099-01-01T00:00:00Z", "code": "000000"},
+        ]
+        results = json.loads(check.validate_batch({"body": json.dumps(checks)}, {})["body"])
+        self.assertEqual([result["status"] for result in results], ["VERIFIED", "VERIFIED", "VERIFIED", "UNVERIFIED", "ERROR"])
+        self.assertEqual(fetch.call_count, 3)
+
+    @freeze_time("2024-09-05T19:10:00Z")
+    @mock.patch("fotw.upstream.fetch")
+    def test_hotp_counts(self, fetch):
+        registry.record([("VK3FUR", 1)])
+        registry.build(self.path("issuance.log"), self.path("registry.idx"))
+        fetch.side_effect = lambda upstream, path: "VK3ABC VERIFIED" if "/VK3ABC/" in path else "UNVERIFIED"
+        lines = []
+        with mock.patch.object(metrics, "ENABLED", True), mock.patch.object(metrics, "emit", lines.append):
+            check.validate(self.event("VK3ABC", "123456"), {})
+            check.validate(self.event("VK3BAD", "000000"), {})
+            checks = [{"callsign": callsign, "timestamp": TIMESTAMP, "code": "000000"} for callsign in ("VK3ABC", "VK3BAD", "VK3BAD2")]
+            check.validate_batch({"body": json.dumps(checks)}, {})
+        self.assertEqual([(line.get("hotp_skipped"), line.get("hotp_backstop")) for line in lines], [(1, None), (None, 1), (1, 2)])
+        self.assertIn({"Name": "hotp_backstop", "Unit": "Count"}, lines[-1]["_aws"]["CloudWatchMetrics"][0]["Metrics"])
+
+    def test_verify_records(self):
+        ca = tq8_fixtures.TestCA()
+        users = [ca.issue("VK3FUR", serial=1234), ca.issue("VK3ABC", serial=5678)]
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        event = {"body": base64.b64encode(gzip.compress(tq8_fixtures.make_tq8([(user, now) for user in users]).encode())).decode()}
+        with mock.patch.object(verify, "ca", lambda: ca.cert), mock.patch.object(verify, "VERIFICATION_SIGDATA", "ZZ9FOTWFT8"):
+            self.addCleanup(verify._cert_cache.clear)
+            verify.verify(event, {})
+        with open(self.path("issuance.log")) as f:
+            self.assertEqual([line.split()[1:] for line in f], [["VK3FUR", "1234"], ["VK3ABC", "5678"]])
+
+if __name__ == '__main__':
+    unittest.main()
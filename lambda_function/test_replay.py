@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+import os
+import io
+import json
+import datetime
+import tempfile
+import contextlib
+import urllib.request
+import urllib.error
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+import replay
+import upstream_standin
+from fotw import keys, upstream, result_cache, ratelimit
+
+TIMESTAMP = "2024-09-05T19:07:00Z"
+
+def check_event(callsign, code, timestamp=TIMESTAMP):
+    return {
+        "httpMethod": "GET",
+        "path": f"/check/{callsign}/{timestamp}/{code}.text",
+        "pathParameters": {"callsign": callsign, "timestamp": timestamp, "code": f"{code}.text"}
+    }
+
+class TestStandIn(unittest.TestCase):
+    def test_error_rate_and_verified_ratio(self):
+        standin = upstream_standin.StandIn(error_rate=0.25, verified_ratio=0.5, seed=1)
+        self.addCleanup(standin.stop)
+        answers = []
+        for _ in range(400):
+            try:
+                answers.append(urllib.request.urlopen(f"{standin.url}/check/VK3FUR/x/1.text").read().decode())
+            except urllib.error.HTTPError as e:
+                answers.append(e.code)
+        self.assertAlmostEqual(answers.count(500) / 400, 0.25, delta=0.08)
+        self.assertAlmostEqual(answers.count("VK3FUR VERIFIED") / 300, 0.5, delta=0.1)
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        ratelimit.reset()
+        for patch in (mock.patch.object(upstream, "UPSTREAMS"), mock.patch.object(result_cache, "backend")):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_replay(self):
+        code = keys.user_key("VK3FUR").hotp.at(int(datetime.datetime.fromisoformat(TIMESTAMP).timestamp() // 30))
+        events = [
+            check_event("VK3FUR", code),
+            check_event("VK3ABC", "000000"),
+            check_event("VK3FUR", "000000", "2099-01-01T00:00:00Z"),
+            {"httpMethod": "POST", "path": "/check", "body": json.dumps([{"callsign": "VK3FUR", "timestamp": TIMESTAMP, "code": code}])},
+            {"pathParameters": {"callsign": "VK3FUR", "timestamp": TIMESTAMP, "code": code}}, # no request line
+            {"httpMethod": "OPTIONS", "path": "/check"},
+            {"httpMethod": "GET", "path": "/prod/check/VK3FUR/x/000000.text"}
+        ]
+        path = os.path.join(self.tmp.name, "events.jsonl")
+        with open(path, "w") as f:
+            f.writelines(json.dumps(event) + "\n" for event in events)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = replay.main([path, "-n", "70", "-c", "1", "--upstream-latency", "0", "--upstream-verified-ratio", "1", "--result-cache", "none"])
+        self.assertEqual(summary["requests"], 70)
+        self.assertEqual(summary["upstream_requests"], 10) # one at a time so singleflight never merges them
+        validate = summary["handlers"]["fotw.check:validate"]
+        self.assertEqual(validate["outcomes"], {"200 VERIFIED": 30, "ValueError: Time in future": 10})
+        self.assertEqual(summary["handlers"]["fotw.check:validate_batch"]["outcomes"], {"200": 10})
+        self.assertEqual(summary["handlers"][replay.UNROUTED]["outcomes"], {"405": 10, "404": 10})
+
+    def test_rate(self):
+        path = os.path.join(self.tmp.name, "events.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps(check_event("VK3ABC", "000000")) + "\n")
+        results, elapsed = replay.replay(replay.load_events(path), concurrency=2, rate=100, count=20)
+        self.assertEqual(len(results), 20)
+        self.assertGreaterEqual(elapsed, 0.19)
+
+if __name__ == '__main__':
+    unittest.main()
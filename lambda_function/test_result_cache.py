@@ -0,0 +1,114 @@
+import unittest
+from unittest import mock
+import os
+import tempfile
+import threading
+import time
+
+from fotw import result_cache
+
+class TestBackends(unittest.TestCase):
+    def check_backend(self, backend):
+        self.assertIsNone(backend.get("VK3FUR/2024-09-05T19:07:00Z/000000"))
+        backend.set("VK3FUR/2024-09-05T19:07:00Z/000000", "VK3FUR VERIFIED", 60)
+        self.assertEqual(backend.get("VK3FUR/2024-09-05T19:07:00Z/000000"), "VK3FUR VERIFIED")
+        backend.set("VK3ABC/2024-09-05T19:07:00Z/000000", "VK3ABC UNVERIFIED", -1)
+        self.assertIsNone(backend.get("VK3ABC/2024-09-05T19:07:00Z/000000"))
+
+    def test_memory(self):
+        self.check_backend(result_cache.MemoryBackend())
+
+    def test_memory_bounded(self):
+        backend = result_cache.MemoryBackend(max_entries=2)
+        for key in ("a", "b", "c"):
+            backend.set(key, "X VERIFIED", 60)
+        self.assertIsNone(backend.get("a"))
+        self.assertEqual(backend.get("c"), "X VERIFIED")
+
+    def test_sqlite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.db")
+            self.check_backend(result_cache.backend_from_config(f"sqlite:{path}"))
+            # a second connection sees the same data
+            self.assertEqual(result_cache.SQLiteBackend(path).get("VK3FUR/2024-09-05T19:07:00Z/000000"), "VK3FUR VERIFIED")
+
+class TestGetOrFetch(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(result_cache, "backend", result_cache.MemoryBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ttl_per_outcome(self):
+        with mock.patch.object(result_cache.backend, "set") as set:
+            result_cache.get_or_fetch("a", lambda: "X VERIFIED")
+            result_cache.get_or_fetch("b", lambda: "X UNVERIFIED")
+        self.assertEqual(set.call_args_list[0].args[2], result_cache.TTL_VERIFIED)
+        self.assertEqual(set.call_args_list[1].args[2], result_cache.TTL_UNVERIFIED)
+
+    def test_cached(self):
+        fetch = mock.Mock(return_value="X VERIFIED")
+        self.assertEqual(result_cache.get_or_fetch("a", fetch), "X VERIFIED")
+        self.assertEqual(result_cache.get_or_fetch("a", fetch), "X VERIFIED")
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_singleflight(self):
+        calls = []
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return "X VERIFIED"
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(result_cache.get_or_fetch("a", fetch))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["X VERIFIED"] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_retry_on(self):
+        # the leader is turned away, the waiters each get to try for themselves
+        started = threading.Event()
+        def limited():
+            started.set()
+            time.sleep(0.2)
+            raise KeyError("limited")
+        results = []
+        def waiter():
+            started.wait()
+            results.append(result_cache.get_or_fetch("a", lambda: "X VERIFIED", retry_on=KeyError))
+        threads = [threading.Thread(target=waiter) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        with self.assertRaises(KeyError):
+            result_cache.get_or_fetch("a", limited, retry_on=KeyError)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["X VERIFIED"] * 4)
+        # anything else is still shared
+        started.clear()
+        def broken():
+            started.set()
+            time.sleep(0.2)
+            raise OSError
+        errors = []
+        def waiter():
+            started.wait()
+            try:
+                result_cache.get_or_fetch("b", lambda: "X VERIFIED", retry_on=KeyError)
+            except OSError as e:
+                errors.append(e)
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        with self.assertRaises(OSError):
+            result_cache.get_or_fetch("b", broken, retry_on=KeyError)
+        thread.join()
+        self.assertEqual(len(errors), 1)
+
+    def test_errors_not_cached(self):
+        with self.assertRaises(OSError):
+            result_cache.get_or_fetch("a", mock.Mock(side_effect=OSError))
+        self.assertEqual(result_cache.get_or_fetch("a", lambda: "X VERIFIED"), "X VERIFIED")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from unittest import mock
+import os
+import io
+import gzip
+import base64
+import hashlib
+import datetime
+import tempfile
+import contextlib
+import tq8_fixtures
+from cryptography.hazmat.primitives import serialization
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+from fotw import revocation, sortedindex, verify, metrics
+
+class TestRevocation(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.ca = tq8_fixtures.TestCA()
+        cls.users = [cls.ca.issue("VK3FUR", serial=1001), cls.ca.issue("VK3ABC", serial=1002), cls.ca.issue("VK3XYZ", serial=1003)]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+        self.index = os.path.join(self.dir, "revocation.idx")
+        for patch in (
+            mock.patch.object(verify, "ca", lambda: self.ca.cert),
+            mock.patch.object(verify, "VERIFICATION_SIGDATA", "ZZ9FOTWFT8"),
+            mock.patch.object(revocation, "REVOCATION_INDEX", self.index),
+            mock.patch.object(revocation, "REVOCATION_CHECK_SECONDS", 0),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(verify._cert_cache.clear)
+        self.addCleanup(verify._verify_memo.clear)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def event(self, users):
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        return {"body": base64.b64encode(gzip.compress(tq8_fixtures.make_tq8([(user, now) for user in users]).encode())).decode()}
+
+    def fingerprint(self, user):
+        return hashlib.sha256(user.cert.public_bytes(serialization.Encoding.DER)).hexdigest()
+
+    def test_parse_list(self):
+        fingerprint = "ab" * 32
+        keys = list(revocation.parse_list(["# revoked", "", "serial 1234", "serial 0x4d2  # same one", f"sha256 {fingerprint}"]))
+        self.assertEqual(keys, [revocation.serial_key(1234), revocation.serial_key(1234), bytes.fromhex(fingerprint)])
+        for bad in ("serial twelve", "sha256 abcd", "md5 00"):
+            with self.assertRaisesRegex(ValueError, "line 1"):
+                list(revocation.parse_list([bad]))
+
+    def test_build_cli(self):
+        listed = self.write("revoked.txt", f"serial 1001\nsha256 {self.fingerprint(self.users[1])}\n")
+        crl = os.path.join(self.dir, "lotw.crl")
+        with open(crl, "wb") as f:
+            f.write(self.ca.crl([1003, 4004]).public_bytes(serialization.Encoding.DER))
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(revocation.main(["build", listed, "--crl", crl, "-o", self.index]), 4)
+        self.assertTrue(revocation.is_revoked(b"\0" * 32, 1001))
+        self.assertTrue(revocation.is_revoked(bytes.fromhex(self.fingerprint(self.users[1])), 1002))
+        self.assertTrue(revocation.is_revoked(b"\0" * 32, 4004))
+        self.assertFalse(revocation.is_revoked(b"\0" * 32, 1002))
+
+    def test_verify(self):
+        revocation.build(self.index, [self.write("revoked.txt", "serial 1002\n")])
+        self.assertIn('"callsign": "VK3FUR"', verify.verify(self.event(self.users[:1]), {})["body"])
+        with self.assertRaisesRegex(ValueError, "Cert revoked"):
+            verify.verify(self.event(self.users[1:2]), {})
+        # in a multi cert log only that group fails
+        body = verify.verify(self.event(self.users), {})["body"]
+        self.assertIn('{"group": 1, "error": "Cert revoked"}', body)
+        self.assertNotIn("VK3ABC", body)
+
+    def test_hot_swap(self):
+        revocation.build(self.index, [self.write("revoked.txt", "serial 1002\n")])
+        event = self.event(self.users[:1])
+        verify.verify(event, {}) # cert now cached
+        revocation.build(self.index, [self.write("revoked.txt", "serial 1001\n")])
+        with self.assertRaisesRegex(ValueError, "Cert revoked"):
+            verify.verify(event, {})
+
+        # broken or missing files keep the last good one
+        with open(self.index + ".new", "wb") as f:
+            f.write(b"oops")
+        os.replace(self.index + ".new", self.index)
+        with self.assertRaisesRegex(ValueError, "Cert revoked"):
+            verify.verify(event, {})
+        os.remove(self.index)
+        self.assertTrue(revocation.is_revoked(b"\0" * 32, 1001))
+
+    def test_check_interval(self):
+        watched = sortedindex.Watched(self.index, check_every=3600)
+        self.assertIsNone(watched.get())
+        sortedindex.build(self.index, [b"a" * 32], 32)
+        self.assertIsNone(watched.get()) # not looked again yet
+        watched.checked -= 3600
+        self.assertIn(b"a" * 32, watched.get())
+
+    def test_memo(self):
+        revocation.build(self.index, [self.write("revoked.txt", "serial 9999\n")])
+        event = self.event(self.users[:1])
+        with mock.patch.object(verify, "VERIFY_MEMO_SIZE", 8):
+            verify.verify(event, {})
+            self.assertEqual(len(verify._verify_memo), 1)
+            revocation.build(self.index, [self.write("revoked.txt", "serial 1001\n")])
+            with self.assertRaisesRegex(ValueError, "Cert revoked"):
+                verify.verify(event, {})
+            self.assertEqual(len(verify._verify_memo), 0)
+
+    def test_unavailable(self):
+        # configured but never built: nothing gets through, and the metric line says why
+        lines = []
+        with mock.patch.object(metrics, "ENABLED", True), mock.patch.object(metrics, "emit", lines.append):
+            with self.assertRaisesRegex(ValueError, "Revocation list unavailable"):
+                verify.verify(self.event(self.users[:1]), {})
+        self.assertEqual(lines[-1]["revocation"], "unavailable")
+        self.assertEqual(lines[-1]["Reason"], "Revocation list unavailable")
+        # built later, warm containers start accepting again
+        revocation.build(self.index, [self.write("revoked.txt", "serial 9999\n")])
+        self.assertIn('"callsign": "VK3FUR"', verify.verify(self.event(self.users[:1]), {})["body"])
+        with mock.patch.object(revocation, "REVOCATION_INDEX", None):
+            self.assertFalse(revocation.is_revoked(b"\0" * 32, 1001))
+
+if __name__ == '__main__':
+    unittest.main()
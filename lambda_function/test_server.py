@@ -0,0 +1,108 @@
+import unittest
+from unittest import mock
+import os
+import gzip
+import json
+import asyncio
+import threading
+import http.client
+import concurrent.futures
+
+mock.patch.dict(os.environ, {"SECRET": "1234567890"}).start()
+from freezegun import freeze_time
+import fotw.keys
+import fotw.server
+import fotw.result_cache
+import fotw.ratelimit
+import test_lambda_function
+
+class ServerCase(unittest.TestCase):
+    verify_workers = 0 # /verify on the same threads as /check
+
+    @classmethod
+    def setUpClass(cls):
+        started = threading.Event()
+        def ready(listener, server):
+            cls.port = listener.sockets[0].getsockname()[1]
+            cls.server = server
+            started.set()
+        cls.loop = asyncio.new_event_loop()
+        cls.task = cls.loop.create_task(fotw.server.serve("127.0.0.1", 0, cls.verify_workers, 4, ready))
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+        started.wait(5)
+
+    @classmethod
+    def tearDownClass(cls):
+        async def stop():
+            # the server and any connection handlers still waiting on a keep-alive
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in tasks:
+                task.cancel()
+            await asyncio.wait(tasks)
+        asyncio.run_coroutine_threadsafe(stop(), cls.loop).result(5)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join(5)
+
+    def setUp(self):
+        fotw.result_cache.backend = fotw.result_cache.MemoryBackend()
+        fotw.ratelimit.reset()
+        self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+
+    def tearDown(self):
+        self.connection.close()
+
+    def request(self, method, path, body=None, headers={}):
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        return response.status, response.read()
+
+class TestServer(ServerCase):
+    def test_check_keep_alive(self):
+        code = fotw.keys.user_key("VK3FUR").hotp.at(int(1725563220 // 30))
+        status, body = self.request("GET", f"/check/VK3FUR/2024-09-05T19:07:00Z/{code}.text")
+        self.assertEqual((status, body), (200, b"VK3FUR VERIFIED"))
+        sock = self.connection.sock
+        with mock.patch("fotw.upstream.fetch", return_value="VK3FUR UNVERIFIED"):
+            status, body = self.request("GET", "/check/VK3FUR/2024-09-05T19:07:00Z/000000.text")
+        self.assertEqual((status, body), (200, b"VK3FUR UNVERIFIED"))
+        self.assertIs(self.connection.sock, sock)
+
+    def test_batch(self):
+        with mock.patch("fotw.upstream.fetch", return_value="VK3FUR UNVERIFIED"):
+            status, body = self.request("POST", "/check", json.dumps([{"callsign": "VK3FUR", "timestamp": "2024-09-05T19:07:00Z", "code": "000000"}]))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)[0]["status"], "UNVERIFIED")
+
+    @freeze_time("2024-10-25")
+    def test_verify(self):
+        status, body = self.request("POST", "/verify", gzip.compress(test_lambda_function.EXAMPLE_TQ8.encode()))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["callsign"], "VK3FUR")
+
+    def test_bad_requests(self):
+        self.assertEqual(self.request("GET", "/check/VK3FUR/2099-01-01T00:00:00Z/000000")[0], 400)
+        self.assertEqual(self.request("POST", "/verify", b"not a log")[0], 400)
+        self.assertEqual(self.request("POST", "/verify", b"")[0], 400)
+        self.assertEqual(self.request("POST", "/check", b"")[0], 400)
+        self.assertEqual(self.request("GET", "/nope")[0], 404)
+        self.assertEqual(self.request("GET", "/verify")[0], 405)
+
+class TestVerifyWorkers(ServerCase):
+    """
+    /verify in a worker process, the way it runs by default
+    """
+    verify_workers = 1
+
+    def test_verify(self):
+        self.assertIsInstance(self.server.verify_pool, concurrent.futures.ProcessPoolExecutor)
+        # rejections come back across the process boundary as 400s with the handler's message
+        self.assertEqual(self.request("POST", "/verify", b"not a log"), (400, b"Log not gzipped"))
+        self.assertEqual(self.request("POST", "/verify", gzip.compress(b"not a tq8")), (400, b"Did not find tCERT"))
+        self.assertEqual(len(self.server.verify_pool._processes), 1)
+        # /check still runs in this process alongside it
+        status, body = self.request("POST", "/check", json.dumps([{"callsign": "VK3FUR", "timestamp": "2099-01-01T00:00:00Z", "code": "000000"}]))
+        self.assertEqual((status, json.loads(body)[0]["status"]), (200, "ERROR"))
+
+if __name__ == '__main__':
+    unittest.main()
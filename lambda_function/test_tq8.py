@@ -0,0 +1,60 @@
+import unittest
+import re
+
+import adif_io
+
+from fotw import tq8
+import test_lambda_function
+
+def adif_io_records(data):
+    # the path verify used to take before tq8
+    data = "<eoh>\n" + data
+    data = re.sub(r'(<SIGN_LOTW_V2)\.\d+(:\d+):\d+(>)', r'\1\2\3', data)
+    qsos, headers = adif_io.read_from_string(data)
+    return [dict(qso) for qso in qsos]
+
+class TestTQ8(unittest.TestCase):
+    def test_parity_with_adif_io(self):
+        for name in dir(test_lambda_function):
+            if name.startswith("EXAMPLE_TQ8"):
+                with self.subTest(name):
+                    data = getattr(test_lambda_function, name)
+                    self.assertEqual(list(tq8.iter_records(data.encode())), adif_io_records(data))
+
+    def test_chunks(self):
+        for name in dir(test_lambda_function):
+            if name.startswith("EXAMPLE_TQ8"):
+                data = getattr(test_lambda_function, name).encode()
+                for size in (1, 7, 100, 4096):
+                    with self.subTest(name, size=size):
+                        chunks = (data[i:i+size] for i in range(0, len(data), size))
+                        self.assertEqual(list(tq8.iter_records(chunks)), list(tq8.iter_records(data)))
+        with self.assertRaises(ValueError):
+            list(tq8.iter_records([b"<CALL:6>VK", b"3F"]))
+
+    def test_sign_lotw_tag(self):
+        records = list(tq8.iter_records(b"<Rec_Type:8>tCONTACT<SIGN_LOTW_V2.0:4:6>abcd<eor>"))
+        self.assertEqual(records, [{"REC_TYPE": "tCONTACT", "SIGN_LOTW_V2": "abcd"}])
+
+    def test_header_dropped(self):
+        records = list(tq8.iter_records(b"<PROGRAMID:4>TQSL<eoh><CALL:6>VK3FUR<eor>"))
+        self.assertEqual(records, [{"CALL": "VK3FUR"}])
+
+    def test_value_containing_tags(self):
+        records = list(tq8.iter_records(b"<NOTES:11><eor><a:1>b<CALL:6>VK3FUR<eor>"))
+        self.assertEqual(records, [{"NOTES": "<eor><a:1>b", "CALL": "VK3FUR"}])
+
+    def test_stops_early(self):
+        records = tq8.iter_records(b"<CALL:6>VK3FUR<eor><CALL:6>VK3ABC<eor><CALL:99999>")
+        self.assertEqual(next(records), {"CALL": "VK3FUR"})
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(tq8.iter_records(b"<CALL:60>VK3FUR<eor>"))
+
+    def test_duplicate_field(self):
+        with self.assertRaises(ValueError):
+            list(tq8.iter_records(b"<CALL:6>VK3FUR<CALL:6>VK3ABC<eor>"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+import time
+import concurrent.futures
+
+from fotw import upstream, breaker
+from upstream_standin import StandIn
+
+class TestUpstream(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+
+    def server(self, *args, **kwargs):
+        server = StandIn(*args, **kwargs)
+        self.servers.append(server)
+        return server
+
+    def test_first_verified_wins(self):
+        slow = self.server("VK3FUR UNVERIFIED", delay=0.5)
+        fast = self.server("VK3FUR VERIFIED")
+        with mock.patch.object(upstream, "UPSTREAMS", [slow.url, fast.url]):
+            started = time.monotonic()
+            self.assertEqual(upstream.check("VK3FUR", "2024-09-05T19:07:00Z", "000000"), "VK3FUR VERIFIED")
+            self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_timeout_and_errors_are_unverified(self):
+        slow = self.server("VK3FUR VERIFIED", delay=1)
+        broken = self.server("oops", status=500)
+        with mock.patch.object(upstream, "UPSTREAMS", [slow.url, broken.url]), mock.patch.object(upstream, "TIMEOUT", 0.2):
+            started = time.monotonic()
+            self.assertEqual(upstream.check("VK3FUR", "2024-09-05T19:07:00Z", "000000"), "VK3FUR UNVERIFIED")
+            self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_queued_requests_cancelled_at_deadline(self):
+        slow = self.server("VK3FUR VERIFIED", delay=0.5)
+        queued = self.server("VK3FUR VERIFIED")
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=1) # the slow one holds the only worker
+        self.addCleanup(pool.shutdown)
+        with mock.patch.object(upstream, "UPSTREAMS", [slow.url, queued.url]), mock.patch.object(upstream, "_pool", pool):
+            breaker.reset()
+            self.addCleanup(breaker.reset)
+            with self.assertRaises(upstream.Unavailable):
+                upstream.ask("VK3FUR", "2024-09-05T19:07:00Z", "000000", deadline=time.monotonic() + 0.1)
+            pool.shutdown()
+        self.assertEqual(queued.requests, 0)
+        self.assertEqual(breaker.get(queued.url).failures, 1)
+
+    def test_hedged_request(self):
+        # first request stalls, the hedged one answers straight away
+        server = self.server("VK3FUR VERIFIED", delay=lambda count: 1 if count == 1 else 0)
+        with mock.patch.object(upstream, "UPSTREAMS", [server.url]), mock.patch.object(upstream, "HEDGE_AFTER", 0.1):
+            started = time.monotonic()
+            self.assertEqual(upstream.check("VK3FUR", "2024-09-05T19:07:00Z", "000000"), "VK3FUR VERIFIED")
+            self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(server.requests, 2)
+
+    def test_hedge_unverified_doesnt_wait_for_original(self):
+        server = self.server("VK3FUR UNVERIFIED", delay=lambda count: 1.5 if count == 1 else 0)
+        with mock.patch.object(upstream, "UPSTREAMS", [server.url]), mock.patch.object(upstream, "HEDGE_AFTER", 0.1), \
+                mock.patch.object(upstream, "TIMEOUT", 1.0):
+            started = time.monotonic()
+            self.assertEqual(upstream.check("VK3FUR", "2024-09-05T19:07:00Z", "000000"), "VK3FUR UNVERIFIED")
+            self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_hedge_losing_race_not_a_failure(self):
+        server = self.server("VK3FUR UNVERIFIED", delay=lambda count: 1.5 if count % 2 else 0)
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+        with mock.patch.object(upstream, "UPSTREAMS", [server.url]), mock.patch.object(upstream, "HEDGE_AFTER", 0.1), \
+                mock.patch.object(upstream, "TIMEOUT", 1.0):
+            for _ in range(3):
+                self.assertEqual(upstream.ask("VK3FUR", "2024-09-05T19:07:00Z", "000000"), "VK3FUR UNVERIFIED")
+        hedged = breaker.get(server.url)
+        self.assertEqual((hedged.state, hedged.failures, len(hedged.calls)), (breaker.CLOSED, 0, 3))
+
+    def test_one_failure_per_upstream_at_deadline(self):
+        server = self.server("VK3FUR VERIFIED", delay=1)
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+        with mock.patch.object(upstream, "UPSTREAMS", [server.url]), mock.patch.object(upstream, "HEDGE_AFTER", 0.1), \
+                mock.patch.object(upstream, "TIMEOUT", 0.3):
+            with self.assertRaises(upstream.Unavailable):
+                upstream.ask("VK3FUR", "2024-09-05T19:07:00Z", "000000")
+        self.assertEqual(server.requests, 2) # hedged
+        self.assertEqual(breaker.get(server.url).failures, 1)
+
+    def test_connection_reused(self):
+        server = self.server("VK3FUR VERIFIED")
+        upstream.fetch(server.url, "/check/VK3FUR/2024-09-05T19:07:00Z/000000.text")
+        connection = upstream._connection(server.url)
+        upstream.fetch(server.url, "/check/VK3FUR/2024-09-05T19:07:00Z/000000.text")
+        self.assertIs(connection, upstream._connection(server.url))
+        self.assertIsNotNone(connection.sock)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Builds signed TQ8 logs against a throwaway CA so tests and benchmarks don't need a real LoTW cert
+
+    ca = TestCA()
+    user = ca.issue("VK3FUR")
+    data = make_tq8([(user, datetime.datetime(2024, 10, 25, 12, 34, tzinfo=datetime.timezone.utc))])
+
+Point fotw.verify.ca at ca.cert to have verify accept them.
+"""
+import base64
+import datetime
+import cryptography.x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+
+CALLSIGN_OID = cryptography.x509.ObjectIdentifier("1.3.6.1.4.1.12348.1.1")
+
+class TestUser:
+    def __init__(self, callsign, key, cert):
+        self.callsign = callsign
+        self.key = key
+        self.cert = cert
+
+    def sign(self, data):
+        return base64.b64encode(self.key.sign(data.encode(), padding.PKCS1v15(), hashes.SHA1())).decode()
+
+class TestCA:
+    def __init__(self, name="FoTW Test CA"):
+        self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        subject = cryptography.x509.Name([cryptography.x509.NameAttribute(NameOID.COMMON_NAME, name)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.cert = (
+            cryptography.x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(subject)
+            .public_key(self.key.public_key())
+            .serial_number(cryptography.x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=3650))
+            .not_valid_after(now + datetime.timedelta(days=3650))
+            .sign(self.key, hashes.SHA256())
+        )
+
+    def issue(self, callsign, not_before=None, not_after=None, serial=None):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        key = rsa.generate_private_key(public_exponent=65537, key_size=1024)
+        cert = (
+            cryptography.x509.CertificateBuilder()
+            .subject_name(cryptography.x509.Name([
+                cryptography.x509.NameAttribute(CALLSIGN_OID, callsign),
+                cryptography.x509.NameAttribute(NameOID.COMMON_NAME, callsign)
+            ]))
+            .issuer_name(self.cert.subject)
+            .public_key(key.public_key())
+            .serial_number(serial or cryptography.x509.random_serial_number())
+            .not_valid_before(not_before or now - datetime.timedelta(days=365))
+            .not_valid_after(not_after or now + datetime.timedelta(days=365))
+            .sign(self.key, hashes.SHA256())
+        )
+        return TestUser(callsign, key, cert)
+
+    def crl(self, serials):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        builder = (
+            cryptography.x509.CertificateRevocationListBuilder()
+            .issuer_name(self.cert.subject)
+            .last_update(now)
+            .next_update(now + datetime.timedelta(days=7))
+        )
+        for serial in serials:
+            builder = builder.add_revoked_certificate(
+                cryptography.x509.RevokedCertificateBuilder().serial_number(serial).revocation_date(now).build()
+            )
+        return builder.sign(self.key, hashes.SHA256())
+
+def _field(name, value):
+    return f"<{name}:{len(value)}>{value}\n"
+
+def make_tq8(groups, call="ZZ9FOTW", signdata=None, signature=None):
+    """
+    groups is a list of (TestUser, qso datetime). Each becomes a tCERT, tSTATION and tCONTACT record
+    """
+    out = _field("TQSL_IDENT", "TQSL V2.7.5 Lib: V2.5 Config: V11.29 AllowDupes: false") + "\n"
+    for uid, (user, when) in enumerate(groups, start=1):
+        der = base64.encodebytes(user.cert.public_bytes(serialization.Encoding.DER)).decode()
+        out += _field("Rec_Type", "tCERT") + _field("CERT_UID", str(uid)) + _field("CERTIFICATE", der) + "<eor>\n\n"
+        out += (_field("Rec_Type", "tSTATION") + _field("STATION_UID", str(uid)) + _field("CERT_UID", str(uid)) +
+                _field("CALL", user.callsign) + _field("GRIDSQUARE", "QF22") + "<eor>\n\n")
+        qso_date = when.strftime("%Y-%m-%d")
+        qso_time = when.strftime("%H:%M:%SZ")
+        data = signdata if signdata is not None else f"QF22{call}FT8{qso_date}{qso_time}"
+        sig = signature if signature is not None else user.sign(data)
+        out += (_field("Rec_Type", "tCONTACT") + _field("STATION_UID", str(uid)) + _field("CALL", call) +
+                _field("BAND", "40M") + _field("MODE", "FT8") + _field("QSO_DATE", qso_date) + _field("QSO_TIME", qso_time) +
+                f"<SIGN_LOTW_V2.0:{len(sig)}:6>{sig}\n" + _field("SIGNDATA", data) + "<eor>\n\n")
+    return out
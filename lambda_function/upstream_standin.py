@@ -0,0 +1,110 @@
+"""
+Local stand-in for https://www.9dx.cc/check/... so tests and benchmarks never touch the real thing
+
+    python upstream_standin.py --port 8081 --delay 0.05
+
+then UPSTREAMS=http://127.0.0.1:8081
+"""
+import sys
+import time
+import random
+import argparse
+import threading
+import http.server
+
+class StandIn(http.server.ThreadingHTTPServer):
+    """
+    Answers every /check/{callsign}/... with body (default "<callsign> UNVERIFIED") after delay seconds.
+    delay can be a callable taking the request number. error_rate of the answers are a 500 instead and
+    verified_ratio of the default answers say VERIFIED
+    """
+    daemon_threads = True
+
+    def __init__(self, body=None, delay=0, status=200, host="127.0.0.1", port=0, start=True, error_rate=0, verified_ratio=0, seed=None):
+        self.body = body
+        self.delay = delay
+        self.status = status
+        self.error_rate = error_rate
+        self.verified_ratio = verified_ratio
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        super().__init__((host, port), Handler)
+        if start:
+            threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        pass # clients hanging up on slow responses is expected
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def respond(self, path):
+        """
+        Returns (status, body) for a request path
+        """
+        callsign = path.strip("/").split("/")[1] if path.count("/") >= 2 else ""
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.error_rate:
+            return 500, "Internal Server Error"
+        if self.body is not None:
+            return self.status, self.body
+        if roll < self.error_rate + self.verified_ratio * (1 - self.error_rate):
+            return self.status, f"{callsign} VERIFIED"
+        return self.status, f"{callsign} UNVERIFIED"
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            count = self.server.requests
+        delay = self.server.delay
+        if callable(delay):
+            delay = delay(count)
+        if delay:
+            time.sleep(delay)
+        status, body = self.server.respond(self.path)
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the 9dx.cc check API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0, help="seconds before answering")
+    parser.add_argument("--body", help="fixed answer, default is '<callsign> UNVERIFIED'")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of requests answered with a 500")
+    parser.add_argument("--verified-ratio", type=float, default=0, help="fraction of default answers that are VERIFIED")
+    args = parser.parse_args(argv)
+    server = StandIn(body=args.body, delay=args.delay, host=args.host, port=args.port, start=False,
+                     error_rate=args.error_rate, verified_ratio=args.verified_ratio)
+    print(f"listening on {args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
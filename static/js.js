@@ -1,7 +1,7 @@
 function downloadAdif(){
     var a = window.document.createElement('a');
     const year = String((new Date()).getFullYear()).padStart(2,'0')
-    const month = String((new Date()).getMonth()).padStart(2,'0')+1
+    const month = String((new Date()).getMonth()+1).padStart(2,'0')
     const day = String((new Date()).getDate()).padStart(2,'0')
     var data = `
 <BAND:3>40m
@@ -31,16 +31,142 @@ function downloadAdif(){
     return false
 }
 
+// Keep in step with lambda_function/fotw/verify.py
+const VERIFICATION_CALL = "ZZ9FOTW"
+const VERIFICATION_MODE = "FT8"
+const DAYS_VALID = 60
+const MAX_DECOMPRESSED = 1024 * 1024
+
+// Gunzips a .tq8, stopping at MAX_DECOMPRESSED. Returns null if the browser can't do it, so the server decides
+async function readTq8(buffer){
+    const bytes = new Uint8Array(buffer)
+    if (bytes.length < 2 || bytes[0] != 0x1f || bytes[1] != 0x8b) {
+        const start = new TextDecoder().decode(bytes.slice(0, 200)).trim()
+        if (start.startsWith("<") || /<eoh>|<eor>/i.test(start)) {
+            throw new Error("This is a plain ADIF file, not a signed log. Open it in TQSL, use \"Sign and save ADIF\" and upload the .tq8 file that creates.")
+        }
+        throw new Error("This doesn't look like a TQSL signed log. Upload the .tq8 file from TQSL's \"Sign and save ADIF\".")
+    }
+    if (typeof DecompressionStream === "undefined") {
+        return null
+    }
+    const reader = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip")).getReader()
+    const chunks = []
+    let total = 0
+    try {
+        while (true) {
+            const { done, value } = await reader.read()
+            if (done) break
+            total += value.length
+            if (total > MAX_DECOMPRESSED) {
+                reader.cancel()
+                throw new Error("This log is far too big to be a FoTW verification log. Sign only the file downloaded in step 1.")
+            }
+            chunks.push(value)
+        }
+    } catch (e) {
+        if (total > MAX_DECOMPRESSED) throw e
+        throw new Error("This .tq8 file is damaged or incomplete. Sign the verification ADIF with TQSL again.")
+    }
+    const data = new Uint8Array(total)
+    let offset = 0
+    for (const chunk of chunks) {
+        data.set(chunk, offset)
+        offset += chunk.length
+    }
+    return data
+}
+
+// Same rules as fotw/tq8.py - upper cased field names, SIGN_LOTW_V2.x read as SIGN_LOTW_V2, header before <eoh> dropped
+function parseTq8(data){
+    const decoder = new TextDecoder()
+    const records = []
+    let record = {}
+    let cursor = 0
+    while (true) {
+        const start = data.indexOf(0x3c, cursor) // <
+        if (start == -1) break
+        const close = data.indexOf(0x3e, start) // >
+        if (close == -1) break
+        const tag = decoder.decode(data.subarray(start + 1, close))
+        const [name, length] = tag.split(":")
+        if (length === undefined) {
+            if (tag.toLowerCase() == "eor") {
+                records.push(record)
+                record = {}
+            } else if (tag.toLowerCase() == "eoh") {
+                record = {}
+            }
+            cursor = close + 1
+            continue
+        }
+        if (!/^[0-9]+$/.test(length)) {
+            cursor = start + 1
+            continue
+        }
+        const valueEnd = close + 1 + parseInt(length)
+        if (valueEnd > data.length) {
+            throw new Error("This .tq8 file is damaged or incomplete. Sign the verification ADIF with TQSL again.")
+        }
+        let field = name.toUpperCase()
+        if (field.startsWith("SIGN_LOTW_V2.")) field = "SIGN_LOTW_V2"
+        record[field] = decoder.decode(data.subarray(close + 1, valueEnd))
+        cursor = valueEnd
+    }
+    return records
+}
+
+// Returns a message for the first thing that would make /verify turn the log down, or null if it looks fine
+function checkTq8(records, now){
+    const certs = records.filter(record => record.REC_TYPE == "tCERT")
+    const contacts = records.filter(record => record.REC_TYPE == "tCONTACT")
+    if (certs.length == 0 || contacts.length == 0) {
+        return "This log has no certificate or contact in it. Sign the verification ADIF from step 1 with TQSL using your callsign's certificate."
+    }
+    if (certs.length != contacts.length) {
+        return "This log's certificates and contacts don't pair up. Sign only the verification ADIF from step 1 - it has exactly one contact."
+    }
+    for (const contact of contacts) {
+        if ((contact.CALL || "").toUpperCase() != VERIFICATION_CALL || (contact.MODE || "").toUpperCase() != VERIFICATION_MODE) {
+            return `This log has a contact with ${contact.CALL} on ${contact.MODE}, not the ${VERIFICATION_CALL} ${VERIFICATION_MODE} verification contact. Sign the verification ADIF from step 1 instead.`
+        }
+        if (!contact.SIGN_LOTW_V2 || !contact.SIGNDATA) {
+            return "The contact in this log isn't signed. Sign the verification ADIF from step 1 with TQSL."
+        }
+        const when = new Date(`${contact.QSO_DATE}T${contact.QSO_TIME}`)
+        if (isNaN(when)) {
+            return `Couldn't read the contact date (${contact.QSO_DATE} ${contact.QSO_TIME}) in this log. Download a new verification ADIF in step 1 and sign that.`
+        }
+        if (Math.abs(when - now) > DAYS_VALID * 24 * 60 * 60 * 1000) {
+            return `The contact in this log is dated ${contact.QSO_DATE}, more than ${DAYS_VALID} days from today. Download a new verification ADIF in step 1 and sign that.`
+        }
+        if (!contact.SIGNDATA.endsWith(VERIFICATION_CALL + VERIFICATION_MODE + contact.QSO_DATE + contact.QSO_TIME)) {
+            return "The signed data in this log doesn't match the verification contact. Sign the verification ADIF from step 1 again, without editing it."
+        }
+    }
+    return null
+}
+
 function uploadAdif(tq){
     console.log(tq)
     const reader = new FileReader();
     reader.onload = async function(e) {
+          const errorBox = document.getElementById("uploadfailure")
+          const successBox = document.getElementById("uploadsuccess")
+          try {
+            const data = await readTq8(e.target.result)
+            const problem = data === null ? null : checkTq8(parseTq8(data), new Date())
+            if (problem) throw new Error(problem)
+          } catch (error) {
+            errorBox.innerText = error.message
+            errorBox.style.display = "block"
+            successBox.style.display = "none"
+            return
+          }
         const response = await fetch("https://fotw.xyz/verify", {
             method: "POST",
             body: e.target.result
           });
-          const errorBox = document.getElementById("uploadfailure")
-          const successBox = document.getElementById("uploadsuccess")
           if (!response.ok) {
             
             errorBox.innerText= "Error processing certificate. Ensure you have followed the instructions above and try again.";
@@ -67,6 +193,12 @@ function uploadAdif(tq){
             
           }
     };
+    if (!tq.files.length) {
+        const errorBox = document.getElementById("uploadfailure")
+        errorBox.innerText = "Pick the .tq8 file TQSL saved first."
+        errorBox.style.display = "block"
+        return false
+    }
     reader.readAsArrayBuffer(tq.files[0]);
     return false
 }
\ No newline at end of file